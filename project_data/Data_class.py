@@ -1,20 +1,17 @@
 """ProjectData."""
 import os
+import sqlite3
+import time
 from argparse import Namespace
-from project_data import pd_gantt, pd_utils, filters
+from project_data import pd_gantt, pd_utils, pd_columns, pd_sql, pd_ngram, pd_snapshot, filters
+from project_data import pd_profile, pd_slowlog, pd_export, pd_frames
 import datetime
 # For distribution copy these files over (+pysqls_utils) and swap comments
 # from project_data import pysqls_tables, state_variable
 from my_utils import state_variable, pysqls_tables
-from tabulate import tabulate
-from matplotlib import MatplotlibDeprecationWarning
-import matplotlib.dates
-import matplotlib.pyplot as plt
-import warnings
+import numpy as np
 import copy
 
-warnings.filterwarnings("ignore", category=MatplotlibDeprecationWarning)
-
 
 class Data(state_variable.StateVar):
     """
@@ -46,7 +43,19 @@ class Data(state_variable.StateVar):
         self.db = pysqls_tables.DB(self.inFile)
         self.make_new_entry = False
         self.gantt_return_info = None
+        self._sort_cache = {}
+        self._status_cache = {}
+        self._frame_cache = {}
+        self.text_index = False
+        self.ngram_index = None
+        self.load_report = None
+        self._conn = None  # kept open so PRAGMA data_version can tell refresh of changes
+        self._data_version = None
+        self._last_rowid = {}  # updated/trace:  highest rowid read (refresh reads later ones)
+        self._own_rowids = {}  # updated/trace:  (after, upto] rowid runs written here, not read
+        self.found_count = 0
 
+    @pd_profile.timed('read_data')
     def read_data(self, since=None):
         """
         Parameters
@@ -55,32 +64,134 @@ class Data(state_variable.StateVar):
             If set, will only load from the updated table after since.
             Running mi.find('since') will show just these.
 
+        If the snapshot_cache state variable is set (and since isn't), the tables and columns
+        come from the .snapshot.npz next to the database when it is up to date, else they are
+        read and the snapshot rewritten.  self.load_report says which and how long it took.
+
         OTHER RANDOM SQLITE3 NOTES:
            for command line sqlite3, select etc (non .commands)  end with ;
            sqlite3 database.db .dump > database.sql          produces a text version
            sqlite3 database.db < database.sql                is the inverse
         """
 
-        self.db.read_table('records', order_by='id')
-        self.num_records = len(self.db.records.refname)
-        if since is not None:
-            print("Type mi.find('since') to see records.")
-            self.db.read_table('updated', order_by='updated', updated='>{}'.format(since))
+        t0 = time.perf_counter()
+        self.load_report = Namespace(source='database', snapshot=None, seconds=None)
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.inFile)
+        self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        self._last_rowid = {}
+        for table in ['updated', 'trace']:
+            xcmd = 'SELECT max(rowid) FROM {}'.format(table)
+            self._last_rowid[table] = self._conn.execute(xcmd).fetchone()[0] or 0
+        self._own_rowids = {}
+        use_snapshot = self.snapshot_cache and since is None
+        loaded = None
+        if use_snapshot:
+            with pd_profile.span('read_data:snapshot load'):
+                key = pd_snapshot.file_key(self.inFile)
+                loaded, arrays = pd_snapshot.load(self.inFile, key)
+        if loaded is not None:
+            for table, cols in loaded.items():
+                setattr(self.db, table, Namespace(**cols))
+            self.columns = pd_columns.Columns.from_arrays(self.db.records, arrays)
+            self.load_report.source = 'snapshot'
+            self.load_report.snapshot = 'used'
         else:
-            self.db.read_table('updated', order_by='updated')
-        self.db.read_table('types')
-        self.db.read_table('trace')
+            with pd_profile.span('read_data:sqlite'):
+                self.db.read_table('records', order_by='id')
+            with pd_profile.span('read_data:columns'):
+                self.columns = pd_columns.Columns(self.db.records)
+            with pd_profile.span('read_data:sqlite'):
+                if since is not None:
+                    print("Type mi.find('since') to see records.")
+                    self.db.read_table('updated', order_by='updated',
+                                       updated='>{}'.format(since))
+                else:
+                    self.db.read_table('updated', order_by='updated')
+                self.db.read_table('types')
+                self.db.read_table('trace')
+            if use_snapshot:
+                try:
+                    pd_snapshot.save(self.inFile, key, self.db, self.columns)
+                    self.load_report.snapshot = 'rewritten ({})'.format(arrays)
+                except OSError as e:
+                    print("Could not write snapshot:  {}".format(e))
+        self.num_records = len(self.db.records.refname)
+        self.ngram_index = None
+        self._data_changed(tables=pd_frames.tables)
+        self.text_index = pd_sql.has_text_index(self._conn)
 
         # collate updated and trace for refname
-        self.updated_collate = {}
-        for i, refname in enumerate(self.db.updated.refname):
-            self.updated_collate.setdefault(refname, [])
-            self.updated_collate[refname].append(i)
-        self.trace_collate = {}
-        for i, refname in enumerate(self.db.trace.refname):
-            self.trace_collate.setdefault(refname, [])
-            self.trace_collate[refname].append(i)
+        with pd_profile.span('read_data:collate'):
+            self.updated_collate = {}
+            for i, refname in enumerate(self.db.updated.refname):
+                self.updated_collate.setdefault(refname, [])
+                self.updated_collate[refname].append(i)
+            self.trace_collate = {}
+            for i, refname in enumerate(self.db.trace.refname):
+                self.trace_collate.setdefault(refname, [])
+                self.trace_collate[refname].append(i)
+        self.load_report.seconds = time.perf_counter() - t0
+
+    @pd_profile.timed('refresh')
+    def refresh(self):
+        """
+        Bring the in-memory data up to date with the database, re-reading just the records
+        logged in the updated table (as update/add do) since the last load, i.e. the updated
+        and trace rows inserted after the ones already read (by rowid, not by their updated
+        date, which the caller sets and may be in the past).  If the number of
+        records then disagrees with the database (changes that weren't logged), it rereads all.
+
+        Returns the number of records refreshed.
+        """
+        if self._conn is None:
+            self.read_data()
+            return self.num_records
+        data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version:
+            return 0
+        self._data_version = data_version
+
+        def select(table, where, params, rowid=False):
+            cols = self.db.tables[table].cols
+            xcmd = 'SELECT {} FROM {} WHERE {}'.format(
+                   ', '.join(['"{}"'.format(x) for x in cols] + (['rowid'] if rowid else [])),
+                   table, where)
+            return [dict(zip(cols + (['rowid'] if rowid else []), x))
+                    for x in self._conn.execute(xcmd, params)]
+
+        new_rows = {}
+        for table in ['updated', 'trace']:
+            rows = select(table, 'rowid > ? ORDER BY rowid', [self._last_rowid.get(table, 0)],
+                          rowid=True)
+            if len(rows):
+                self._last_rowid[table] = rows[-1]['rowid']
+            own = self._own_rowids.pop(table, [])  # already in memory
+            new_rows[table] = [x for x in rows
+                               if not any(lo < x['rowid'] <= hi for lo, hi in own)]
+        touched = sorted(set([x['refname'] for x in new_rows['updated']]))
+        new_records = []
+        for j in range(0, len(touched), 500):
+            these = touched[j:j + 500]
+            where = 'refname IN ({})'.format(', '.join(['?'] * len(these)))
+            for row in select('records', where, these):
+                i = self.columns.refname_row.get(row['refname'])
+                if i is None:
+                    new_records.append(row)
+                    continue
+                new_data = {k: v for k, v in row.items() if getattr(self.db.records, k)[i] != v}
+                if len(new_data):
+                    self._patch_record(i, new_data)
+        self._append_records(new_records)
+        self._append_rows('trace', new_rows['trace'])
+        self._append_rows('updated', new_rows['updated'])
+        if self._conn.execute('SELECT count(*) FROM records').fetchone()[0] != self.num_records:
+            print("Records changed without an updated entry:  rereading all.")
+            self.read_data()
+            return self.num_records
+        return len(touched)
 
+    @pd_profile.timed('dtype_info')
     def dtype_info(self, dtype='nsfC', just_dates=False, plot_stats='complete,cdf'):
         """
         Print out a short timeline of dtype and make cdf-squares plot.
@@ -109,6 +220,9 @@ class Data(state_variable.StateVar):
                                      datetime.datetime.strftime(end, '%Y/%m/%d')))
             pd10 = 10 * '-'
             proj_year = 0
+            if not just_dates:
+                bounds = [pd_utils.get_qtr_date(q, rec.start) for q in range(duration_qtr + 1)]
+                found_by_qtr = self.find_periods(bounds, **self.last_find)
             for q in range(duration_qtr):
                 if not q % 4:
                     proj_year += 1
@@ -124,7 +238,12 @@ class Data(state_variable.StateVar):
                 qtr = pd_utils.get_qtr_date(q + 1, rec.start) - tdelt
                 quarters[q].append(qtr)
                 if not just_dates:
-                    self.find(quarters[q][0], quarters[q][1], display='noshow', **self.last_find)
+                    self.find_stats = {}
+                    if len(found_by_qtr[q]):
+                        self.make_find_stats(found_by_qtr[q])
+                        self.show_find_stats()
+                    else:
+                        print('No records found.')
                     quarters['stats'].append(copy.copy(self.find_stats))
                     try:
                         add_color = pd_gantt.lag2rgb(self.find_stats['complete']['ave'])
@@ -139,68 +258,58 @@ class Data(state_variable.StateVar):
                     self.plot_find_stats(gstatus=gs, figure=pn)
         self.quarters = quarters
 
+    @pd_profile.timed('make_find_stats')
     def make_find_stats(self, foundrec):
+        """
+        Count, net and average lag per status type (and the date span) of the found records,
+        grouped with bincount over the status and date columns.
+        """
         self.find_stats = {}
         if not len(foundrec):
             return
-        for gs in self.ganttable_status.keys():
-            self.find_stats[gs.lower()] = {"cnt": 0, "net": 0, "ave": 0.0}
+        stat_types = [gs.lower() for gs in self.ganttable_status.keys()]
+        for gs in stat_types:
+            self.find_stats[gs] = {"cnt": 0, "net": 0, "ave": 0.0}
         self.find_stats["_time1"] = None
         self.find_stats["_time2"] = None
-        now = datetime.datetime.now()
-        need_to_set_time = True
-        for i in foundrec:
-            this_status = self.db.records.status[i]
-            this_date = pd_utils.get_time(self.db.records.value[i])
-            if this_date is None:
-                continue
-            if need_to_set_time:
-                need_to_set_time = False
-                self.find_stats['_time1'] = this_date
-                self.find_stats['_time2'] = this_date
-            else:
-                if this_date < self.find_stats['_time1']:
-                    self.find_stats['_time1'] = this_date
-                if this_date > self.find_stats['_time2']:
-                    self.find_stats['_time2'] = this_date
-            if this_status is None:
-                if this_date is None:
-                    lag = 0
-                else:
-                    lag = (now - this_date).days
-                if lag <= 0:
-                    sdict = {'_type': 'none', 'net': 1, 'cnt': 1, 'ave': 1}
-                else:
-                    sdict = {'_type': 'late', 'net': 1, 'cnt': 1, 'ave': lag}
-            else:
-                this_status_type = None
-                for stat_type in self.find_stats.keys():
-                    if stat_type in this_status.lower():
-                        this_status_type = stat_type
-                        break
-                if this_status_type is None:
-                    print("Status type {} uncounted".format(this_status))
-                    continue
-                sdict = {'_type': this_status_type.lower(), 'net': 0, 'cnt': 1, 'ave': 0}
-                try:
-                    val = float(this_status.split()[1])
-                    sdict['net'] = 1
-                    sdict['ave'] = val
-                except (ValueError, IndexError):
-                    pass
-            this = sdict['_type'].lower()
-            for k, v in sdict.items():
-                if k.startswith('_'):
-                    continue
-                self.find_stats[this][k] += v
-        for stat_type, val in self.find_stats.items():
-            if stat_type.startswith('_'):
-                continue
-            if val['net']:
-                x = val['ave'] / val['net']
-                self.find_stats[stat_type]['ave'] = x
+        found = np.asarray(foundrec, dtype=int)
+        dates = self.columns.value_date[found]
+        found = found[~np.isnat(dates)]
+        dates = dates[~np.isnat(dates)]
+        if not len(found):
+            return
+        self.find_stats['_time1'] = dates.min().astype('datetime64[us]').item()
+        self.find_stats['_time2'] = dates.max().astype('datetime64[us]').item()
 
+        cats = self.columns.categories['status']
+        by_cat = np.array([(-2, 0, 0.0) if x is None else pd_columns.stats_status(x, stat_types)
+                           for x in cats], dtype=float).reshape(-1, 3)
+        cat = self.columns.codes['status'][found]
+        stat_type = by_cat[cat, 0].astype(int)
+        net = by_cat[cat, 1]
+        ave = by_cat[cat, 2]
+        no_status = stat_type == -2  # lateness from the date
+        lag = (np.datetime64(self.get_as_of(), 'D') - dates[no_status]).astype(int)
+        stat_type[no_status] = np.where(lag > 0, stat_types.index('late'),
+                                        stat_types.index('none'))
+        net[no_status] = 1
+        ave[no_status] = np.where(lag > 0, lag, 1)
+        for i in np.flatnonzero(stat_type == -1):
+            print("Status type {} uncounted".format(self.db.records.status[found[i]]))
+        counted = stat_type >= 0
+        grouped = pd_columns.group_by(stat_type[counted], len(stat_types),
+                                      net=net[counted], ave=ave[counted])
+        for j, gs in enumerate(stat_types):
+            this = self.find_stats[gs]
+            this['cnt'] = int(grouped['cnt'][j])
+            this['net'] = int(grouped['net'][j])
+            this['ave'] = float(grouped['ave'][j])
+            if this['net']:
+                this['ave'] = this['ave'] / this['net']
+
+    @pd_profile.timed('show_find_stats')
     def show_find_stats(self):
+        from tabulate import tabulate
         headers = ['Type', 'Count', 'Net', 'Average']
         table_data = []
         print("\nPeriod: {}  -  {}"
@@ -213,9 +322,12 @@ class Data(state_variable.StateVar):
             table_data.append(row)
         print(tabulate(table_data, headers=headers, tablefmt='orgtbl'))
 
+    @pd_profile.timed('plot_find_stats')
     def plot_find_stats(self, gstatus='complete', figure='cdf'):
         max_marker_size = 45.0
         normalize_marker_to = 10.0
+        import matplotlib.dates
+        plt = pd_gantt.pyplot()
         fig = plt.figure("Plot_Stats")
         try:
             dt = (self.find_stats['_time2'] - self.find_stats['_time1']) / 2
@@ -226,12 +338,11 @@ class Data(state_variable.StateVar):
         clr = self.find_stats[gstatus]['ave']
         sze = self.find_stats[gstatus]['net']
         if figure == 'cdf' and self.gantt_return_info is not None:
-            y = None
-            for i, date_num in enumerate(self.gantt_return_info['cdf_x']):
-                if date_num > x_num:
-                    y = self.gantt_return_info['cdf_y'][i] / self.gantt_return_info['cdf_tot']
-                    break
-            if y is None:
+            cdf_x = self.gantt_return_info['cdf_x']
+            i = np.searchsorted(cdf_x, x_num, side='right')  # first day after x_num
+            if i < len(cdf_x):
+                y = self.gantt_return_info['cdf_y'][i] / self.gantt_return_info['cdf_tot']
+            else:
                 y = 0.5
         else:
             y = self.find_stats[gstatus]['ave']
@@ -243,6 +354,8 @@ class Data(state_variable.StateVar):
         fig.autofmt_xdate()
 
 # ###############################################FIND###################################################
+    @pd_profile.timed('find')
+    @pd_slowlog.logged('find', rows=lambda self, result, *args, **kwargs: self.found_count)
     def find(self, value, value2=None, field='value', match='weak', display='gantt', **kwargs):
         """
         This will find records matching value, except for milestones which looks between
@@ -263,52 +376,45 @@ class Data(state_variable.StateVar):
                      - dtype, status, owner, other, id
         """
 
-        # Set defaults and run through kwarg filters
-        self.filter = filters.Filter()
-        self.filter.set_find_default()
-        self.filter.dtype = self.find_dtype
+        with pd_profile.span('find:filter'):
+            self.set_filter(**kwargs)
         self.find_stats = {}
-        for k, v in kwargs.items():
-            if k in self.filter.find_allowed:
-                vl = pd_utils.listify(v)
-                setattr(self.filter, k, vl)
-            else:
-                print('keyword {} not allowed'.format(k))
-                continue
-
-        self.last_find = kwargs
+        self.found_count = 0
         foundrec = []
         if value == 'since':  # assumes read_data(since='') has been executed
             for k in self.updated_collate:
-                foundrec.append(self.db.records.refname.index(k))
+                foundrec.append(self.columns.refname_row[k])
         elif self.dbtype in self.db_list['ganttable'] and field.lower() == 'value':
             # ...value is a date, so checking dtype and date(s)
             if value2 is None:
                 value2 = value
                 value = self.projectStart
-            value1time = pd_utils.get_time(value)
-            value2time = pd_utils.get_time(value2)
+            with pd_profile.span('find:parse'):
+                value1time = pd_utils.get_time(value)
+                value2time = pd_utils.get_time(value2)
             if not isinstance(value1time, datetime.datetime) or not isinstance(value2time, datetime.datetime):  # noqa
                 return 0
-            for i, rdata in enumerate(getattr(self.db.records, field)):  # Loop over all records
-                if rdata is None:
-                    continue
-                if '-' in rdata:  # A date range is given - use first
-                    val2check = pd_utils.get_time(rdata.split('-')[0].strip())
-                else:
-                    val2check = pd_utils.get_time(str(rdata).strip())
-                if not isinstance(val2check, datetime.datetime):
-                    continue
-                status = self.check_ganttable_status(self.db.records.status[i], val2check)
-                recns = self.db.mk_entry_ns('records', i)
+            if 'upda' in match.lower() or 'init' in match.lower():
+                with pd_profile.span('find:scan'):
+                    as_of = self.get_as_of()
+                    for i in range(self.num_records):  # Loop over all records
+                        val2check = self.columns.get_datetime(i, 'start')  # first date if range
+                        if val2check is None:
+                            continue
+                        status = self.check_ganttable_status(self.db.records.status[i], val2check,
+                                                             as_of=as_of)
+                        recns = self.db.mk_entry_ns('records', i)
 
-                if self.filter.on_fields(recns, status) and\
-                   self.filter.on_time(val2check, value1time, value2time, match, recns):
-                    foundrec.append(i)
+                        if self.filter.on_fields(recns, status) and\
+                           self.filter.on_time(val2check, value1time, value2time, match, recns):
+                            foundrec.append(i)
+            else:
+                with pd_profile.span('find:window'):
+                    foundrec = self.find_window(value1time, value2time)
         else:
-            for i, rdata in enumerate(getattr(self.db.records, field)):
-                if pd_utils.searchfield(value, rdata, match):
-                    foundrec.append(i)
+            with pd_profile.span('find:text'):
+                foundrec = self.find_text(value, field, match)
+        self.found_count = len(foundrec)
         if len(foundrec):
             foundrec = self.getview(foundrec, self.display_howsort)
             self.make_find_stats(foundrec)
@@ -319,6 +425,129 @@ class Data(state_variable.StateVar):
         else:
             print('No records found.')
 
+    def set_filter(self, **kwargs):
+        """Set defaults and run through kwarg filters (as for find)."""
+        self.filter = filters.Filter()
+        self.filter.set_find_default()
+        self.filter.dtype = self.find_dtype
+        for k, v in kwargs.items():
+            if k in self.filter.find_allowed:
+                vl = pd_utils.listify(v)
+                setattr(self.filter, k, vl)
+            else:
+                print('keyword {} not allowed'.format(k))
+                continue
+        self.last_find = kwargs
+
+    def find_periods(self, bounds, **kwargs):
+        """
+        Single-pass ganttable find over consecutive periods.
+
+        Parameters
+        ----------
+        bounds : list of datetime
+            Period q is bounds[q] <= date < bounds[q + 1]
+        kwargs
+            find filters
+
+        Returns
+        -------
+        list
+            For each period, the list of record indices (sorted as getview) found in it.
+        """
+        self.set_filter(**kwargs)
+        edges = np.array([np.datetime64(x, 'D') for x in bounds])
+        inside = self.find_window(bounds[0], bounds[-1] - datetime.timedelta(days=1))
+        period = np.searchsorted(edges, self.columns.start[inside], side='right') - 1
+        sorted_inside = np.asarray(self.getview(inside, self.display_howsort), dtype=int)
+        period_of = np.full(self.num_records, -1)
+        period_of[inside] = period
+        sorted_period = period_of[sorted_inside]
+        return [sorted_inside[sorted_period == q].tolist() for q in range(len(bounds) - 1)]
+
+    def find_window(self, value1time, value2time):
+        """
+        Vectorized ganttable find:  returns the indices (in record order) of records whose
+        (first) date is within value1time - value2time and that pass self.filter.
+        """
+        start = self.columns.start
+        snapshot = self.status_snapshot('start')
+        mask = self.columns.valid & (start >= np.datetime64(value1time))
+        mask &= start <= np.datetime64(value2time)
+        mask &= self.filter.on_columns(self.columns, snapshot.code, snapshot.names)
+        return np.flatnonzero(mask).tolist()
+
+    def find_text(self, value, field='description', match='weak'):
+        """
+        Non-date find:  indices of records whose field matches value (see pd_utils.searchfield).
+        weak/moderate searches of the text fields use the FTS5 index if there is one (see
+        build_text_index) to get the candidates, otherwise all records are scanned.
+        """
+        candidates = range(self.num_records)
+        if self.text_index and match in ['weak', 'moderate'] and isinstance(value, str):
+            conn = sqlite3.connect(self.inFile)
+            try:
+                refnames = pd_sql.text_candidates(conn, field, value)
+            finally:
+                conn.close()
+            if refnames is not None:
+                row = self.columns.refname_row
+                candidates = sorted([row[x] for x in refnames if x in row])
+        data = getattr(self.db.records, field)
+        return [i for i in candidates if pd_utils.searchfield(value, data[i], match)]
+
+    def build_text_index(self):
+        """
+        Create the optional FTS5 shadow index of description/notes/commentary in the database.
+        Triggers keep it in sync with any later change to records, which means every sqlite
+        writing to this database then needs FTS5 (see pd_sql.create_text_index);  undo it with
+        drop_text_index.
+        """
+        conn = sqlite3.connect(self.inFile)
+        try:
+            self.text_index = pd_sql.create_text_index(conn)
+        finally:
+            conn.close()
+        return self.text_index
+
+    def drop_text_index(self):
+        """Remove the FTS5 index and its triggers from the database (find then scans)."""
+        conn = sqlite3.connect(self.inFile)
+        try:
+            pd_sql.drop_text_index(conn)
+            self.text_index = pd_sql.has_text_index(conn)
+        finally:
+            conn.close()
+        return self.text_index
+
+    @pd_profile.timed('query')
+    def query(self, value, value2=None, field='value', match='weak', howsort=None, **kwargs):
+        """
+        Like find, but the filters are compiled into a sqlite query (see pd_sql) so only the
+        matching records are read.  Doesn't need read_data.  Returns a list of Namespaces
+        of the matching records, sorted on howsort (default display_howsort).  Statuses are
+        judged at get_as_of(), as in find.
+        """
+        if howsort is None:
+            howsort = self.display_howsort
+        kwargs.setdefault('dtype', self.find_dtype)
+        for k in list(kwargs.keys()):
+            if k not in filters.find_allowed:
+                print('keyword {} not allowed'.format(k))
+                del kwargs[k]
+        conn = pd_sql.connect(self.inFile, self.ganttable_status, now=self.get_as_of())
+        try:
+            fields = [x[1] for x in conn.execute('PRAGMA table_info(records)')]
+            sql, params = pd_sql.compile_find(value, value2, field=field, match=match,
+                                              ganttable=self.dbtype in self.db_list['ganttable'],
+                                              project_start=self.projectStart, fields=fields,
+                                              order_by=pd_utils.listify(howsort), **kwargs)
+            cursor = conn.execute(sql, params)
+            cols = [x[0] for x in cursor.description]
+            return [Namespace(**dict(zip(cols, row))) for row in cursor]
+        finally:
+            conn.close()
+
     def unique(self, field, filter_on=None, returnList=False):
         """
         Searches the given field in self.db.records and comes up with a list of
@@ -347,7 +576,10 @@ class Data(state_variable.StateVar):
         if returnList:
             return unique_values
 
-    def getref(self, sval, search='description', method='start', verbose=True, retain_case=False):
+    @pd_profile.timed('getref')
+    @pd_slowlog.logged('getref')
+    def getref(self, sval, search='description', method='start', verbose=True, retain_case=False,
+               best=False):
         """
         Find a record searching various fields.
 
@@ -363,37 +595,67 @@ class Data(state_variable.StateVar):
             if found just one, this will diplsay or not
         retain_case : bool
             if not retain_case, it will check all lower
+        best : bool
+            if True, return the best ranked refname/description match (see rank_refs)
 
         Returns
         -------
         None or str
             Returns refname if one and only one is found, else None
         """
+        if best:
+            ranked = self.rank_refs(sval, k=1)
+            if not len(ranked):
+                print("0 found")
+                return None
+            if verbose:
+                self.show([self.columns.refname_row[ranked[0][0]]])
+            return ranked[0][0]
         fndi = []
-        for i, dbdesc in enumerate(getattr(self.db.records, search)):
-            if filters.agrees(sval, dbdesc, method=method, retain_case=retain_case):
-                fndi.append(i)
+        if search == 'refname' and method not in ['in', 'start'] and isinstance(sval, str):
+            if retain_case:
+                fndi = [self.columns.refname_row[sval]] if sval in self.columns.refname_row else []
+            else:
+                fndi = sorted(self.columns.refname_fold.get(sval.lower(), []))
+        else:
+            for i, dbdesc in enumerate(getattr(self.db.records, search)):
+                if filters.agrees(sval, dbdesc, method=method, retain_case=retain_case):
+                    fndi.append(i)
         if len(fndi) == 1:
             if verbose:
                 self.show(fndi)
             return self.db.records.refname[fndi[0]]
         print("{} found".format(len(fndi)))
         self.listing(fndi)
+        if not len(fndi) and isinstance(sval, str):
+            print("Closest:")
+            for refname, score in self.rank_refs(sval):
+                i = self.columns.refname_row[refname]
+                print("  {:.2f}  {}:  {}".format(score, refname, self.db.records.description[i]))
         return None
 
+    def rank_refs(self, sval, k=5):
+        """
+        Return the k best (refname, score) matches of sval to the refnames/descriptions, using
+        a trigram index.  score is the fraction of trigrams of sval matched (1.0 is all).
+        """
+        if self.ngram_index is None:
+            self.ngram_index = pd_ngram.NgramIndex()
+            for i in range(self.num_records):
+                self.ngram_index.add(i, self.db.records.refname[i], self.db.records.description[i])
+        ranked = self.ngram_index.search(sval, k)
+        return [(self.db.records.refname[i], score) for i, score in ranked]
+
     def find_matching_refname(self, refname):
         """
         This takes a refname of unknown capitalization and finds the correct refname.
         If a string is returned, it is an exact match.
         If a list if returned, it is a lower()ed match to that/those.
         """
-        if refname in self.db.records.refname:
+        if refname in self.columns.refname_row:
             return refname
-        ret_refn = []
-        for db_refname in self.db.records.refname:
-            if refname.lower() == db_refname.lower():
-                ret_refn.append(db_refname)
-        return ret_refn
+        matching = self.columns.refname_fold.get(refname.lower(), [])
+        return [self.db.records.refname[i] for i in matching]
 
 # ################################################UPDATE################################################
     def add(self, dt=None, updater=None, upnote=None, **kwargs):
@@ -401,25 +663,66 @@ class Data(state_variable.StateVar):
         Adds a new record (essentially a wrapper for update which
         generates a refname and enables new)
         """
-        self.make_new_entry = True
+        refname = self._new_refname(kwargs)
+        if refname is not None:
+            self.make_new_entry = True
+            self.update(refname, dt, updater, upnote, **kwargs)
+            self.make_new_entry = False
+
+    def add_many(self, records, dt=None, updater=None, upnote=None):
+        """
+        Adds new records in a single transaction (see update_many).
+
+        Parameters
+        ----------
+        records : iterable of dict
+            Each the kwargs of an add call (must include description and value)
+        dt, updater, upnote
+            As for add, used for records that don't include them.
+
+        Returns
+        -------
+        list
+            refnames of the added records
+        """
+        changes = []
+        taken = set()
+        next_id = max([x for x in self.db.records.id if x is not None], default=0) + 1
+        for rec in records:
+            rec = dict(rec)
+            refname = self._new_refname(rec, taken)
+            if refname is None:
+                continue
+            taken.add(refname)
+            if 'id' not in rec.keys():
+                rec['id'] = next_id
+                next_id += 1
+            rec['refname'] = refname
+            changes.append(rec)
+        return self.update_many(changes, dt, updater, upnote, new=True)
+
+    def _new_refname(self, kwargs, taken=()):
+        """Return a new unique refname for the add kwargs (None if not possible)."""
+        def exists(refname):
+            return refname in self.columns.refname_row or refname in taken
+
         if 'description' not in kwargs.keys():
             print("New entries must include a description.\nNot adding record.")
-            return
+            return None
         if 'value' not in kwargs.keys():
             print("New entries must include a value.\nNot adding record.")
-            return
+            return None
         refname_maxlen = len(pd_utils.make_refname(kwargs['description'], 200))
         if 'refname' in kwargs.keys():
-            if kwargs['refname'] in self.db.records.refname:
+            if exists(kwargs['refname']):
                 refname = None
             else:
                 refname = kwargs['refname']
-                refname_len = len(refname)
                 del kwargs['refname']
         else:
             refname_len = 80
             refname = pd_utils.make_refname(kwargs['description'], refname_len)
-            while refname in self.db.records.refname:
+            while exists(refname):
                 refname_len += 2
                 if refname_len > refname_maxlen:
                     refname = None
@@ -427,61 +730,113 @@ class Data(state_variable.StateVar):
                 refname = pd_utils.make_refname(kwargs['description'], refname_len)
         if refname is None:
             print("Not unique refname for {}\nNot adding record.".format(kwargs['description']))
-        else:
-            self.update(refname, dt, updater, upnote, **kwargs)
-        self.make_new_entry = False
+        return refname
 
+    @pd_profile.timed('update')
+    @pd_slowlog.logged('update')
     def update(self, refname, dt=None, updater=None, upnote=None, **kwargs):
         """
         Updates a record field as well as the updated db, adds if not present
             name is the refname of the record, if not present a new entry is made
             dt is the YY/MM/DD of updated time (default is now)
-            updater is the name of the updater (default is to query)
-            upnote is the note to be included in updated record (default is to query
-            or 'initial' on creation)
+            updater is the name of the updater (default is session_updater, else query)
+            upnote is the note to be included in updated record (default is session_upnote,
+            else query or 'initial' on creation)
             kwargs should be valid key=value pairs
         """
-        try:
-            i_chng = self.db.records.refname.index(refname)
-            changing = self.db.mk_entry_ns('records', i_chng)
-        except ValueError:
-            changing = None
-        if changing is None and not self.make_new_entry:
-            print("No update: {} not present to update.".format(refname))
+        change = self._plan_change(refname, self.make_new_entry, kwargs)
+        if change is None:
             return False
-        elif changing is not None and self.make_new_entry:
+        if updater is None:
+            updater = self.session_updater
+        if updater is None:
+            updater = pd_slowlog.prompt("Who is updating:  ")
+        if upnote is None and not change.new:
+            upnote = self.session_upnote
+        if upnote is None and not change.new:
+            upnote = pd_slowlog.prompt("Update note to append previous record notes:  ")
+        self._commit_changes([change], dt, updater, upnote)
+        return True
+
+    @pd_profile.timed('update_many')
+    @pd_slowlog.logged('update_many', rows=lambda self, result, changes, *args, **kwargs:
+                       len(changes))
+    def update_many(self, changes, dt=None, updater=None, upnote=None, new=False):
+        """
+        Updates (or with new=True adds) many records in one sqlite transaction, never prompting.
+
+        Parameters
+        ----------
+        changes : iterable of dict
+            Each has the refname and the key=value pairs of an update call, and may also
+            include its own dt, updater and upnote.
+        dt : str or None
+            YY/MM/DD of updated time (default is now)
+        updater : str or None
+            Name of the updater (default is session_updater)
+        upnote : str or None
+            Note for the updated table (default is session_upnote when updating, and 'Initial'
+            when new, as update does)
+        new : bool
+            Add the records as new ones
+
+        Returns
+        -------
+        list
+            refnames that were changed
+        """
+        if updater is None:
+            updater = self.session_updater
+        if upnote is None and not new:
+            upnote = self.session_upnote
+        planned = []
+        pending = {}  # refname: fields set by the changes planned so far
+        for chng in changes:
+            chng = dict(chng)
+            refname = chng.pop('refname')
+            when = chng.pop('dt', dt)
+            by = chng.pop('updater', updater)
+            note = chng.pop('upnote', upnote)
+            if by is None or (note is None and not new):
+                raise ValueError("update_many needs an updater and upnote (or session_ ones) "
+                                 "for {}".format(refname))
+            change = self._plan_change(refname, new, chng, pending)
+            if change is not None:
+                planned.append((change, when, by, note))
+                pending.setdefault(refname, {}).update(change.new_data)
+        self._commit_changes(planned)
+        return [x[0].refname for x in planned]
+
+    def _plan_change(self, refname, new, kwargs, pending=None):
+        """
+        Check an update/add of refname and sort its kwargs into the record fields to set and
+        the trace rows to add.  Returns a Namespace of the change, or None if nothing changes.
+        pending is {refname: {field: value}} of changes planned but not yet committed, which
+        are taken as the previous values.
+        """
+        pending = {} if pending is None else pending
+        i_chng = self.columns.refname_row.get(refname)
+        if refname in pending and new:
+            i_chng = -1  # added earlier in the batch
+        if i_chng is None and not new:
+            print("No update: {} not present to update.".format(refname))
+            return None
+        elif i_chng is not None and new:
             print("No update:  {} already exists, can't add it as new.".format(refname))
-            return False
+            return None
 
-        changed = False
-        if changing is None:
-            changing = Namespace()
-            changing.refname = refname
+        change = Namespace(refname=refname, row=i_chng, new=new, new_data={}, old_data={},
+                           trace=[])
+        if new:
             if 'id' not in kwargs.keys():
-                id = max(self.db.records.id) + 1
-            else:
-                id = kwargs['id']
-            changing.id = id
-            if upnote is None:
-                upnote = 'Initial'
-            self.db.add_entry('records', cols_to_add=changing)
-            changed = True
-            print(f"Making new refname {refname} with id {id}.")
-        # Process it
-        new_data = {}
-        old_data = {}
+                kwargs['id'] = max([x for x in self.db.records.id if x is not None], default=0) + 1
+            print(f"Making new refname {refname} with id {kwargs['id']}.")
         for fld, new_value in kwargs.items():
             if 'trace' in fld.lower():
                 ttype = fld[0:-5]
-                trlist = new_value.split(',')
-                trace_entries = Namespace(refname=[], tracename=[], tracetype=[])
-                for tr in trlist:
-                    trace_entries.refname.append(refname)
-                    trace_entries.tracename.append(tr)
-                    trace_entries.tracetype.append(ttype)
+                for tr in new_value.split(','):
+                    change.trace.append({'refname': refname, 'tracename': tr, 'tracetype': ttype})
                     print('\tAdding trace {}.{} to {}'.format(ttype, tr, refname))
-                self.db.add_entry('trace', colns_to_add=trace_entries)
-                changed = True
             elif fld == 'refname':
                 print("Don't do that.")
                 continue
@@ -489,37 +844,137 @@ class Data(state_variable.StateVar):
                 print('{} is not a database field - skipping'.format(fld))
                 continue
             else:
-                old_data[fld] = getattr(self.db.records, fld)
-                new_data[fld] = new_value
-                changed = True
-        if len(list(new_data.keys())):
-            self.db.update_entry('records', changing, **new_data)
-
-        if changed:  # Need to update 'updated' database table
-            self.db.read_table('records')
-            old_vals = ''
-            if not self.make_new_entry:
-                for k, v in old_data.items():
-                    old_vals += '[{}: {}]'.format(k, v[i_chng])
-            nupd = Namespace(refname=refname, previous=old_vals)
-            if dt is None:
-                bbb = datetime.datetime.now()
-                nupd.updated = "{:02d}/{:02d}/{:02d}".format(bbb.year - 2000, bbb.month, bbb.day)
-            else:
-                nupd.updated = dt
-            if updater is None:
-                nupd.by = input("Who is updating:  ")
-            else:
-                nupd.by = updater
-            if upnote is None:
-                nupd.note = input("Update note to append previous record notes:  ")
+                if not new:
+                    if fld in pending.get(refname, {}):
+                        change.old_data[fld] = pending[refname][fld]
+                    else:
+                        change.old_data[fld] = getattr(self.db.records, fld)[i_chng]
+                change.new_data[fld] = new_value
+        if not new and not len(change.new_data) and not len(change.trace):
+            return None
+        return change
+
+    def _commit_changes(self, planned, dt=None, updater=None, upnote=None):
+        """
+        Write planned changes (from _plan_change, or tuples of (change, dt, updater, upnote))
+        to the database in one transaction, then patch them into memory.
+        """
+        sql = {'records': {}, 'trace': [], 'updated': []}
+        new_records = []
+        patches = []
+        for change in planned:
+            if isinstance(change, tuple):
+                change, dt_c, updater_c, upnote_c = change
             else:
-                nupd.note = upnote
+                dt_c, updater_c, upnote_c = dt, updater, upnote
+            if change.new:
+                row = dict(change.new_data, refname=change.refname)
+                new_records.append(row)
+                sql['records'].setdefault(('INSERT', tuple(row.keys())), []).append(
+                    list(row.values()))
+                if upnote_c is None:
+                    upnote_c = 'Initial'
+            elif len(change.new_data):
+                patches.append((change.row, change.new_data))
+                sql['records'].setdefault(('UPDATE', tuple(change.new_data.keys())), []).append(
+                    list(change.new_data.values()) + [change.refname])
+            sql['trace'] += change.trace
+            if dt_c is None:
+                bbb = datetime.datetime.now()
+                dt_c = "{:02d}/{:02d}/{:02d}".format(bbb.year - 2000, bbb.month, bbb.day)
+            old_vals = ''
+            for k, v in change.old_data.items():
+                old_vals += '[{}: {}]'.format(k, v)
+            sql['updated'].append({'refname': change.refname, 'previous': old_vals,
+                                   'updated': dt_c, 'by': updater_c, 'note': upnote_c})
 
-            self.db.add_entry('updated', nupd)
-        return changed
+        written = {}  # table:  (max rowid before, after the inserts)
+        conn = sqlite3.connect(self.inFile)
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')  # so the rows inserted below get rowids in a run
+                for (action, flds), values in sql['records'].items():
+                    if action == 'INSERT':
+                        xcmd = "INSERT INTO records ({}) VALUES ({})".format(
+                               ', '.join(flds), ', '.join(['?'] * len(flds)))
+                    else:
+                        xcmd = "UPDATE records SET {} WHERE refname=?".format(
+                               ', '.join(['{}=?'.format(x) for x in flds]))
+                    conn.executemany(xcmd, values)
+                for table in ['trace', 'updated']:
+                    if len(sql[table]):
+                        flds = list(sql[table][0].keys())
+                        xcmd = "INSERT INTO {} ({}) VALUES ({})".format(
+                               table, ', '.join(flds), ', '.join(['?'] * len(flds)))
+                        xmax = 'SELECT max(rowid) FROM {}'.format(table)
+                        after = conn.execute(xmax).fetchone()[0] or 0
+                        conn.executemany(xcmd, [[x[f] for f in flds] for x in sql[table]])
+                        written[table] = (after, conn.execute(xmax).fetchone()[0])
+        finally:
+            conn.close()
+        for table, (after, upto) in written.items():
+            if after == self._last_rowid.get(table, 0):
+                self._last_rowid[table] = upto
+            else:  # others' rows not yet read:  refresh reads those and skips these
+                self._own_rowids.setdefault(table, []).append((after, upto))
+
+        for i, new_data in patches:
+            self._patch_record(i, new_data)
+        self._append_records(new_records)
+        self._append_rows('trace', sql['trace'])
+        self._append_rows('updated', sql['updated'])
+
+    def _patch_record(self, i, new_data):
+        """Patch the in-memory records row i (lists and columns) with new_data."""
+        for fld, new_value in new_data.items():
+            getattr(self.db.records, fld)[i] = new_value
+        self.columns.set_row(i, **new_data)
+        if self.ngram_index is not None and 'description' in new_data:
+            self.ngram_index.add(i, self.db.records.refname[i], new_data['description'])
+        self._data_changed(fields=new_data.keys())
+
+    def _append_records(self, rows):
+        """Append rows (dicts of field values) to the in-memory records and columns."""
+        if not len(rows):
+            return
+        for j, row in enumerate(rows):
+            for col in self.db.tables['records'].cols:
+                getattr(self.db.records, col).append(row.get(col))
+            if self.ngram_index is not None:
+                self.ngram_index.add(self.columns.size + j, row['refname'], row.get('description'))
+        self.columns.append_rows(rows)
+        self.num_records = len(self.db.records.refname)
+        self._data_changed()
+
+    def _append_rows(self, table, rows):
+        """Append rows (dicts of field values) to the in-memory updated/trace table and collate."""
+        tbl = getattr(self.db, table)
+        collate = {'updated': self.updated_collate, 'trace': self.trace_collate}[table]
+        for row in rows:
+            for col in self.db.tables[table].cols:
+                getattr(tbl, col).append(row.get(col))
+            collate.setdefault(row['refname'], []).append(len(tbl.refname) - 1)
+        self._data_changed(fields=[], tables=[table])
+
+    def _data_changed(self, fields=None, tables=('records',)):
+        """
+        Hook to invalidate what is derived from the data once it changes.  fields are the
+        records fields patched (None if records were added or reread, which drops all the
+        sort orders and status snapshots), and tables the tables whose frames are dropped.
+        """
+        for table in tables:
+            self._frame_cache.pop(table, None)
+        if fields is None:
+            self._sort_cache = {}
+            self._status_cache = {}
+            return
+        fields = set(fields)
+        self._sort_cache = {k: v for k, v in self._sort_cache.items() if fields.isdisjoint(k)}
+        if 'value' in fields or 'status' in fields:
+            self._status_cache = {}
 
 # ##################################################################VIEW##################################################################
+    @pd_profile.timed('getview')
     def getview(self, view, howsort=None):
         if howsort is None:
             howsort = self.display_howsort
@@ -535,17 +990,17 @@ class Data(state_variable.StateVar):
         if howsort is None or not len(howsort):
             these_ind = view
         else:
-            self.sorted_ind = self.sortby(howsort)
-            these_ind = []
-            for i in self.sorted_ind:
-                if i in view:
-                    these_ind.append(i)
+            self.sorted_ind = self.sort_order(howsort)
+            in_view = np.zeros(self.num_records, dtype=bool)
+            in_view[np.asarray(view, dtype=int)] = True
+            these_ind = self.sorted_ind[in_view[self.sorted_ind]].tolist()
         return these_ind
 
     def noshow(self, view):
         """This just returns the indices to view but doesn't display anything"""
         return view
 
+    @pd_profile.timed('display:show')
     def show(self, view, output='stdout'):
         if output != 'stdout':
             save2file = True
@@ -576,27 +1031,79 @@ class Data(state_variable.StateVar):
             print('Writing data to ' + output)
             fp.close()
 
+    @pd_profile.timed('display:fileout')
     def fileout(self, view):
-        tag = self.output_filename.split('.')[1]
-        if tag == 'csv':
-            import csv
-        with open(self.output_filename, 'w') as output_file:
-            if tag == 'csv':
-                s = ['value', 'description', 'owner', 'status', 'other', 'notes', 'commentary']
-                csvw = csv.writer(output_file)
-                csvw.writerow(s)
-            for key in view:
-                rec = self.db.mk_entry_ns('records', key)
-                if tag == 'csv':
-                    s = [rec.value, rec.description, rec.owner, rec.status, rec.other,
-                         rec.notes, rec.commentary]
-                    csvw.writerow(s)
-                else:
-                    s = ('{} ({:8s}) {}:  {}   ({})\n'
-                         .format(rec.value, rec.owner, rec.description, rec.status, key))
-                    output_file.write(s)
+        """Write view to output_filename (format from its extension, see export)."""
+        self.export(view, self.output_filename, columns=self.output_columns)
         print('Writing file to ', self.output_filename)
 
+    @pd_profile.timed('export')
+    def export(self, view, filename, columns=None, fmt=None, chunk=pd_export.default_chunk):
+        """
+        Stream the records of view to filename, chunk rows at a time.
+
+        Parameters
+        ----------
+        view : list or 'all'
+            Record indices (e.g. from find(..., display='noshow'))
+        filename : str
+            File to write
+        columns : list or None
+            records fields and/or the joins 'updated', 'trace', 'last_updated' (see pd_export)
+            [output_columns]
+        fmt : str or None
+            csv, jsonl, parquet or txt (the fileout text layout) [from the extension]
+        chunk : int
+            Rows gathered and written at a time
+
+        Returns
+        -------
+        int
+            Number of records written
+        """
+        fmt = pd_export.file_format(filename, fmt)
+        if fmt == 'txt':
+            columns = pd_export.txt_columns
+        elif columns is None:
+            columns = self.output_columns
+        for col in columns:
+            if col not in self.db.tables['records'].cols and col not in pd_export.joins:
+                raise ValueError("{} not a records field or join.".format(col))
+        if view == 'all':
+            view = range(self.num_records)
+        types = pd_export.record_types(self._conn, columns)
+        chunks = pd_export.record_chunks(self, view, columns, chunk)
+        return pd_export.write_chunks(filename, fmt, columns, types, chunks)
+
+    def export_table(self, table, filename, columns=None, fmt=None, chunk=pd_export.default_chunk):
+        """
+        Stream a whole database table (e.g. updated, for the full history) to filename straight
+        from a sqlite cursor;  doesn't need read_data.  See pd_export.export_table.
+        """
+        conn = sqlite3.connect(self.inFile)
+        try:
+            return pd_export.export_table(conn, table, filename, fmt=fmt, columns=columns,
+                                          chunk=chunk)
+        finally:
+            conn.close()
+
+    def to_numpy(self, table='records', view=None, structured=False):
+        """
+        Return table (records, updated or trace) as {column: numpy array}, or one structured
+        array if structured.  view (e.g. find(..., display='noshow')) selects records rows.
+        See pd_frames for what is shared with the columns and what is copied.
+        """
+        return pd_frames.to_numpy(self, table, view, structured=structured)
+
+    def to_arrow(self, table='records', view=None):
+        """Return table (records, updated or trace) as a pyarrow Table, see to_numpy."""
+        return pd_frames.to_arrow(self, table, view)
+
+    def to_pandas(self, table='records', view=None):
+        """Return table (records, updated or trace) as a pandas DataFrame, see to_numpy."""
+        return pd_frames.to_pandas(self, table, view)
+
+    @pd_profile.timed('display:listing')
     def listing(self, view):
         """
         Provides a short listing of the given records (default is all) in fixed widths.
@@ -605,7 +1112,13 @@ class Data(state_variable.StateVar):
             rec = self.db.mk_entry_ns('records', i)
             print('{:10.10} {} ({})'.format(rec.value, rec.description, rec.status))
 
-    def gantt(self, view):
+    @pd_profile.timed('display:gantt')
+    @pd_slowlog.logged('gantt', rows=lambda self, result, view, *args, **kwargs: len(view))
+    def gantt(self, view, fig=None, cdf_fig=None):
+        """
+        Plot the gantt chart of view, on pyplot figures or on fig/cdf_fig if given (in which
+        case the color bar is left to the caller).
+        """
         if self.dbtype not in self.db_list['ganttable']:
             print('{} not ganttable:  ', self.dbtype)
             return
@@ -617,13 +1130,13 @@ class Data(state_variable.StateVar):
             if gantt_annot not in self.db.tables['records'].cols and gantt_annot is not None:
                 print("{} annot not found to use.".format(gantt_annot))
                 return
-        gdat = Namespace(labels=[], dates=[], tstats=[], preds=[], annots=[])
+        gdat = Namespace(labels=[], dates=[], tstats=[], annots=[])
+        snapshot = self.status_snapshot('end')
         for v in view:
             field_rec = self.db.mk_entry_ns('records', v)
             label = [getattr(field_rec, gl) for gl in self.gantt_label]
             label = pd_gantt.check_gantt_labels(': '.join(label), gdat.labels)[:self.gantt_label_length]  # noqa
             value = str(getattr(field_rec, 'value'))
-            status = str(getattr(field_rec, 'status')).lower().strip()
             annot = []
             for ga in self.gantt_annot:
                 if ga is None:
@@ -637,38 +1150,132 @@ class Data(state_variable.StateVar):
                 else:
                     annot.append(str(gafr))
             annot = '; '.join(annot)
-            predv = []
-            if 'milestoneTrace' in dir(field_rec):
-                milepred = getattr(field_rec, 'milestoneTrace')
-                if self.dbtype == 'milestone' or self.dbtype == 'wbs':
-                    for x in milepred:
-                        if x in view:
-                            predv.append(getattr(field_rec, 'description')[0:self.gantt_label_length])  # noqa
-            if 'taskTrace' in dir(field_rec):
-                taskpred = getattr(field_rec, 'taskTrace')
-                if self.dbtype == 'task' or self.dbtype == 'wbs':
-                    for x in taskpred:
-                        if x in view:
-                            predv.append(getattr(field_rec, 'description')[0:self.gantt_label_length])  # noqa
             gdat.labels.append(label)
-            gdat.preds.append(predv)
             gdat.dates.append(value)
             gdat.annots.append(annot)
-            status_return = self.check_ganttable_status(status, value)
-            gdat.tstats.append(status_return)
-        if not self.plot_predecessors:
-            gdat.preds = None
+            gdat.tstats.append(snapshot.status(v))
+        pairs = None
+        if self.plot_predecessors:
+            pairs = self.predecessor_pairs(view)
         other_labels = None
         if len(self.gantt_annot):
             other_labels = gdat.annots
         show_cdf = self.show_cdf and self.filter.status[0].lower() != 'late'
-        g = pd_gantt.plotGantt(gdat.labels, gdat.dates, gdat.preds, gdat.tstats,
-                               show_cdf=show_cdf, other_labels=other_labels)
+        g = pd_gantt.plotGantt(gdat.labels, gdat.dates, status_codes=gdat.tstats,
+                               show_cdf=show_cdf, other_labels=other_labels,
+                               predecessor_pairs=pairs, fig=fig, cdf_fig=cdf_fig,
+                               as_of=snapshot.as_of)
         self.gantt_return_info = g
-        if self.show_color_bar and self.filter.status[0].lower() != 'late':
+        if fig is None and self.show_color_bar and self.filter.status[0].lower() != 'late':
             pd_gantt.colorBar()
 
-    def check_ganttable_status(self, status, valuetime):
+    def export_gantt(self, views, outdir='.', fmt='png', dpi=100, colorbar=False):
+        """
+        Write the gantt chart (and cdf, if plotted) of each view to files, without a display.
+        The figures are made once off pyplot and reused for every view.
+
+        Parameters
+        ----------
+        views : list of dict
+            find arguments for each view, i.e. value (and value2) and any filters such as
+            dtype/owner/status.  'name' sets the file name [gantt_<n>]
+        outdir : str
+            Directory for the files
+        fmt : str
+            File format (png, svg, pdf)
+        dpi : int
+            Resolution of raster formats
+        colorbar : bool
+            If True, also write the color bar
+
+        Returns
+        -------
+        list
+            The files written
+        """
+        os.makedirs(outdir, exist_ok=True)
+        fig = pd_gantt.new_figure()
+        cdf_fig = pd_gantt.new_figure()
+        written = []
+
+        def save(this_fig, name):
+            filename = os.path.join(outdir, '{}.{}'.format(name, fmt))
+            this_fig.savefig(filename, format=fmt, dpi=dpi)
+            written.append(filename)
+
+        try:
+            for n, view in enumerate(views):
+                view = dict(view)
+                name = view.pop('name', 'gantt_{:03d}'.format(n))
+                found = self.find(view.pop('value'), view.pop('value2', None), display='noshow',
+                                  **view)
+                if not found:
+                    continue
+                self.gantt_return_info = None
+                self.gantt(found, fig=fig, cdf_fig=cdf_fig)
+                if not self.gantt_return_info:
+                    continue
+                save(fig, name)
+                if self.gantt_return_info['cdf_x'] is not None:
+                    save(cdf_fig, '{}_cdf'.format(name))
+            if colorbar:
+                pd_gantt.colorBar(fig=fig)
+                save(fig, 'colorbar')
+        finally:
+            fig.clear()
+            cdf_fig.clear()
+        return written
+
+    def predecessor_pairs(self, view):
+        """
+        Return the (position, predecessor position) pairs within view from the trace table.
+        A record's predecessors are the records of this database it traces to (for wbs, both
+        milestones and tasks).
+        """
+        pred_types = {'milestone': ['milestone'], 'task': ['task'],
+                      'wbs': ['milestone', 'task']}.get(self.dbtype, [])
+        position = {}
+        for k, v in enumerate(view):
+            position.setdefault(self.db.records.refname[v], k)
+        pairs = []
+        for k, v in enumerate(view):
+            for ti in self.trace_collate.get(self.db.records.refname[v], []):
+                if self.db.trace.tracetype[ti] not in pred_types:
+                    continue
+                j = position.get(self.db.trace.tracename[ti])
+                if j is not None and j != k:
+                    pairs.append((k, j))
+        return pairs
+
+    def get_as_of(self, as_of=None):
+        """The time statuses are evaluated at:  as_of, else the as_of state variable, else now."""
+        if as_of is None:
+            as_of = self.as_of
+        if as_of is None:
+            return datetime.datetime.now()
+        return pd_utils.get_time(as_of)
+
+    def status_snapshot(self, which='start', as_of=None):
+        """
+        Return the pd_columns.StatusSnapshot (status code, color and lag of every record)
+        classified on the 'start' or 'end' date of value.
+
+        It is evaluated as of as_of (default the as_of state variable, else now) and cached
+        until the records or as_of change.  With neither set it is cached for the day (value
+        dates are days, so lateness doesn't change within one).
+        """
+        if as_of is None and self.as_of is None:
+            as_of = self.get_as_of()
+            key = (which, np.datetime64(as_of, 'D'))
+        else:
+            as_of = self.get_as_of(as_of)
+            key = (which, as_of)
+        if key not in self._status_cache:
+            self._status_cache[key] = pd_columns.StatusSnapshot(
+                self.columns, self.ganttable_status, getattr(self.columns, which), as_of)
+        return self._status_cache[key]
+
+    def check_ganttable_status(self, status, valuetime, as_of=None):
         """
                 self.ganttable_status = {'removed': 'w',
                                          'late': 'r',
@@ -676,16 +1283,10 @@ class Data(state_variable.StateVar):
                                          'none': 'k',
                                          'complete': 'b',
                                          'unknown': 'm'}
+        Per-record version of status_snapshot:  late is judged at as_of (see get_as_of).
         """
-        # Get status_code
-        if status is None or status.lower().startswith('no') or not len(status):
-            status_code = 'none'
-        else:
-            status = status.lower().split()
-            status_code = status[0]
-        if status_code not in self.ganttable_status.keys():
-            status_code = 'unknown'
-        tcode = self.ganttable_status[status_code]
+        status_code, lag, statustime, tcode = pd_columns.parse_status(status,
+                                                                      self.ganttable_status)
         if status_code == 'removed':
             return (status_code, tcode)
 
@@ -695,18 +1296,10 @@ class Data(state_variable.StateVar):
             valuetime = pd_utils.get_time(valuetime)
         elif not isinstance(valuetime, datetime.datetime):
             print("Invalid time:  ", valuetime, type(valuetime))
-        now = datetime.datetime.now()
+        now = self.get_as_of(as_of)
 
-        lag = 0.0
-        if status is not None and len(status) == 2:
-            try:
-                lag = float(status[1])
-            except ValueError:
-                statustime = pd_utils.get_time(status[1])
-                if isinstance(statustime, datetime.datetime):
-                    lag = (statustime - valuetime) / 3600.0 / 24.0
-                else:
-                    tcode = status[1]
+        if statustime is not None:
+            lag = (statustime - valuetime).total_seconds() / 3600.0 / 24.0
 
         if now > valuetime and status_code != 'complete':
             status_code = 'late'
@@ -716,20 +1309,40 @@ class Data(state_variable.StateVar):
         return (status_code, tcode)
 
     def sortby(self, sort_it_by):
-        sortable_dict = {}
+        return self.sort_order(sort_it_by).tolist()
+
+    @pd_profile.timed('sort_order')
+    def sort_order(self, sort_it_by):
+        """
+        Return the record indices sorted on the sort_it_by fields as a numpy array.  The
+        order is computed once per sort_it_by (with lexsort on per-field ranks) and cached
+        until the records change.  Records with an identical key keep only the last one.
+        """
+        cache_key = tuple(sort_it_by)
+        if cache_key in self._sort_cache:
+            return self._sort_cache[cache_key]
+        keys = [[] for sb in sort_it_by]
+        columns = [getattr(self.db.records, sb) for sb in sort_it_by]
         for i in range(self.num_records):
             this_key = []
-            for sb in sort_it_by:
-                sdt = getattr(self.db.records, sb)[i]
+            for j, sb in enumerate(sort_it_by):
+                sdt = columns[j][i]
                 if sdt is None:
                     sdt = '{:06d}'.format(i)
-                elif isinstance(sdt, list):
-                    ','.join(sdt)
                 if sdt in this_key:
                     sdt = "{}{:06d}".format(sdt, i)
                 this_key.append(sdt)
-            sortable_dict[tuple(this_key)] = i
-        sl = []
-        for key in sorted(sortable_dict.keys()):
-            sl.append(sortable_dict[key])
-        return sl
+                keys[j].append(sdt)
+        ranks = []
+        for key in keys:
+            key_array = np.empty(len(key), dtype=object)
+            key_array[:] = key
+            ranks.append(np.unique(key_array, return_inverse=True)[1].reshape(-1))
+        order = np.lexsort(ranks[::-1]) if len(ranks) else np.arange(self.num_records)
+        if len(order) > 1:  # identical keys:  keep the last (as a dict keyed on the key would)
+            same_as_next = np.ones(len(order) - 1, dtype=bool)
+            for rank in ranks:
+                same_as_next &= rank[order[1:]] == rank[order[:-1]]
+            order = order[~np.append(same_as_next, False)]
+        self._sort_cache[cache_key] = order
+        return order
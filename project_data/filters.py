@@ -1,4 +1,5 @@
-from project_data import pd_utils
+import numpy as np
+from project_data import pd_utils, pd_columns
 
 find_allowed = ['dtype', 'status', 'owner', 'other', 'id']
 
@@ -80,17 +81,50 @@ class Filter:
         """
         for field in self.find_allowed:
             finding = getattr(self, field)
-            rec_val = getattr(rec, field)
             if field == 'status':
                 val = [status[0].lower()]
-            elif rec_val is None:
-                val = ['None']
             else:
-                val = [str(x).lower() for x in pd_utils.listify(rec_val)]
+                val = self._rec_val(getattr(rec, field))
             if not self._filter_field(finding, val):
                 return False
         return True
 
+    def _rec_val(self, rec_val):
+        if rec_val is None:
+            return ['None']
+        return [str(x).lower() for x in pd_utils.listify(rec_val)]
+
+    def on_columns(self, columns, status_codes, status_names):
+        """
+        Vectorized on_fields over all records.
+        Parameters:
+        -----------
+        columns:  is the pd_columns.Columns of the records
+        status_codes:  index into status_names for each record (StatusSnapshot.code)
+        status_names:  the status names (StatusSnapshot.names)
+        Each distinct value of a field is checked once, then broadcast over the records by code;
+        id is compared numerically (np.isin), and fields set to a pass_thru value are skipped.
+        Returns a boolean mask.
+        """
+        mask = np.ones(columns.size, dtype=bool)
+        for field in self.find_allowed:
+            finding = getattr(self, field)
+            if any([str(x).strip().lower() in self.pass_thru for x in finding]):
+                continue
+            if field == 'id':
+                wanted = [pd_columns.to_number(x) for x in finding]
+                mask &= np.isin(columns.id, [x for x in wanted if not np.isnan(x)])
+                continue
+            if field == 'status':
+                vals = [[x.lower()] for x in status_names]
+                codes = status_codes
+            else:
+                vals = [self._rec_val(x) for x in columns.categories[field]]
+                codes = columns.codes[field]
+            keep = np.array([self._filter_field(finding, val) for val in vals], dtype=bool)
+            mask &= keep[codes]
+        return mask
+
     def on_time(self, vtime, v1time, v2time, match, rec):
         """
         Filter on time.
@@ -1,16 +1,19 @@
-"""Project Data overall load."""
-from project_data import Data_class, pd_tools
+"""
+Project Data overall load.
+
+Importing this reads nothing:  the databases are read the first time they are used,
+e.g. pd.mi or pd.find(...).  Use pd.banner() for the shortcuts and pd.nsf_dates() for
+the NSF reporting dates.
+"""
+import datetime
 
 # Shortcut for showing things not complete
 undone = ['late', 'moved', 'none', 'unknown']
-print('undone defined: ', undone)
 
-available_db = sorted(Data_class.pd_utils.get_db_json('databases.json')[0].keys())
 available_db = ['milestone']  # for now since I don't use any others
-if 'architecture' in available_db:
-    from project_data import Arch_class
-if 'cost' in available_db:
-    from project_data import Cost_class
+db_handles = {'mi': 'milestone', 'ta': 'task', 'wb': 'wb', 'rs': 'reqspec', 'ri': 'risk',
+              'ic': 'interface', 'ar': 'architecture', 'co': 'cost'}
+shortcuts = ['pdshortcut', 'ref', 'find', 'update']
 
 
 class ProjectDataShortcut:
@@ -22,7 +25,8 @@ class ProjectDataShortcut:
         self.ref = self.db.getref(desc, **kwargs)
 
     def find(self, end_date, **kwargs):
-        """Provides a call to the db find method."""
+        """Provides a call to the db find method (first picking up any changes to the db)."""
+        self.db.refresh()
         self.db.find(end_date, **kwargs)
 
     def update(self, **kwargs):
@@ -30,60 +34,91 @@ class ProjectDataShortcut:
         self.db.update(self.ref, **kwargs)
 
 
-print("Read in:")
-for db in available_db:
+def _load(handle):
+    """Read in the database for handle (one of db_handles)."""
+    from project_data import Data_class
+    db = db_handles[handle]
     if db == 'milestone':
         mi = Data_class.Data('milestone')
         mi.read_data()
         print("mi : milestone")
+        return mi
     elif db == 'task':
         ta = Data_class.Data('task', verbose=False)
         ta.readData()
         print("ta : task")
+        return ta
     elif db == 'wb':
         wb = Data_class.Data('wbs', verbose=False)
-        wb.concatDat([mi, ta])
+        wb.concatDat([globals()['mi'], globals()['ta']])
         print("wb : mi+ta=wbs")
+        return wb
     elif db == 'reqspec':
         rs = Data_class.Data('reqspec', verbose=False)
         rs.readData()
         print("rs : reqspec")
+        return rs
     elif db == 'risk':
         ri = Data_class.Data('risk', verbose=False)
         ri.readData()
         print("ri : risk")
+        return ri
     elif db == 'interface':
         ic = Data_class.Data('interface', verbose=False)
         ic.readData()
         print("ic : interface")
+        return ic
     elif db == 'architecture':
+        from project_data import Arch_class
         ar = Arch_class.Data(verbosity=False)
         ar.readData()
         print("ar : Architecture")
+        return ar
     elif db == 'cost':
+        from project_data import Cost_class
         co = Cost_class.Cost(verbosity=False)
         co.getCost()
         co.getBudget()
         print("co : Cost")
+        return co
+
+
+def __getattr__(name):
+    """Read the database handles (and make the shortcuts) on first access."""
+    if name in db_handles and db_handles[name] in available_db:
+        globals()[name] = _load(name)
+        return globals()[name]
+    if name in shortcuts:
+        mi = globals()['mi'] if 'mi' in globals() else __getattr__('mi')  # keep a read mi
+        pdshortcut = ProjectDataShortcut(mi)
+        globals().update(pdshortcut=pdshortcut, ref=pdshortcut.getref, find=pdshortcut.find,
+                         update=pdshortcut.update)
+        return globals()[name]
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
+
+
+def banner():
+    """Print the shortcuts available."""
+    print('undone defined: ', undone)
+    print("Databases (read on first use):  {}".format(
+        ', '.join(['{} : {}'.format(k, v) for k, v in db_handles.items() if v in available_db])))
+    print("\npd.ref() shortcut for pd.mi.getref() via ProjectDataShortcut")
+    print("pd.find() shortcut for pd.mi.find() via ProjectDataShortcut with auto-ref")
+    print("pd.update() shortcut for pd.mi.update() via ProjectDataShortcut")
+
 
-pdshortcut = ProjectDataShortcut(mi)
-print("\npd.ref() shortcut for pd.mi.getref() via ProjectDataShortcut")
-ref = pdshortcut.getref
-print("pd.find() shortcut for pd.mi.find() via ProjectDataShortcut with auto-ref")
-find = pdshortcut.find
-print("pd.update() shortcut for pd.mi.update() via ProjectDataShortcut")
-update = pdshortcut.update
-
-cutoff = Data_class.datetime.datetime(year=2020, month=10, day=1)
-nsfb = []
-for i, b in enumerate(pd_tools.generate_recurring('9/1/16', '12/31/21', show_print=False)):
-    if b > cutoff:
-        nsfb.append(f"{i:02d}:  {Data_class.datetime.datetime.strftime(b, '%Y-%m-%d')}")
-nsfc = []
-for i, c in enumerate(pd_tools.generate_recurring('10/1/18', '12/31/21', show_print=False)):
-    if c > cutoff:
-        nsfc.append(f"{i:02d}:  {Data_class.datetime.datetime.strftime(c, '%Y-%m-%d')}")
-nsfc.append("")  # because I know c is one entry shorter...
-print("NSF-B\t\t\t\tNSF-C")
-for b, c in zip(nsfb, nsfc):
-    print(f"{b}\t\t\t{c}")
+def nsf_dates(cutoff=datetime.datetime(year=2020, month=10, day=1)):
+    """Print the NSF-B and NSF-C reporting dates after cutoff."""
+    from project_data import pd_tools
+    nsfb = []
+    for i, b in enumerate(pd_tools.generate_recurring('9/1/16', '12/31/21', show_print=False)):
+        if b > cutoff:
+            nsfb.append(f"{i:02d}:  {datetime.datetime.strftime(b, '%Y-%m-%d')}")
+    nsfc = []
+    for i, c in enumerate(pd_tools.generate_recurring('10/1/18', '12/31/21', show_print=False)):
+        if c > cutoff:
+            nsfc.append(f"{i:02d}:  {datetime.datetime.strftime(c, '%Y-%m-%d')}")
+    nsfc.append("")  # because I know c is one entry shorter...
+    print("NSF-B\t\t\t\tNSF-C")
+    for b, c in zip(nsfb, nsfc):
+        print(f"{b}\t\t\t{c}")
@@ -0,0 +1,360 @@
+"""Typed, column-oriented copy of the records table."""
+import numpy as np
+from project_data import pd_utils, pd_gantt, pd_dates
+
+NaT = np.datetime64('NaT', 'D')
+encoded_fields = ['dtype', 'status', 'owner', 'other']
+
+
+def to_number(val):
+    """val as a float (e.g. an id), nan if it isn't a number."""
+    try:
+        return float(str(val).strip())
+    except ValueError:
+        return np.nan
+
+
+def to_numbers(values):
+    return np.fromiter((to_number(x) for x in values), dtype=float, count=len(values))
+
+
+def to_day(timestr):
+    """Parse a yy/mm/dd (or yyyy/mm/dd) string to a datetime64[D], NaT if it isn't one."""
+    timeval = pd_dates.parse_ymd(timestr)
+    if timeval is None:
+        return NaT
+    return np.datetime64(timeval.date(), 'D')
+
+
+def split_value(value):
+    """
+    Return the (start, end, is_range) for a records value.
+
+    A date range is given as 'start - end'.  find uses the first date and
+    check_ganttable_status the last, so both are kept.
+    """
+    if value is None:
+        return NaT, NaT, False
+    value = str(value)
+    if '-' in value:
+        parts = value.split('-')
+        return to_day(parts[0]), to_day(parts[-1]), True
+    day = to_day(value)
+    return day, day, False
+
+
+def split_values(values):
+    """split_value of each of values, as (start, end, is_range) arrays."""
+    uniq = {}
+    inverse = np.fromiter((uniq.setdefault(x, len(uniq)) for x in values), dtype=np.int64,
+                          count=len(values))
+    first, last, is_range = [], [], np.zeros(len(uniq), dtype=bool)
+    for i, value in enumerate(uniq):
+        if value is None:
+            parts = [None]
+        else:
+            parts = str(value).split('-')
+            is_range[i] = len(parts) > 1
+        first.append(parts[0])
+        last.append(parts[-1])
+    start = pd_dates.to_datetime64(first)[inverse]
+    end = pd_dates.to_datetime64(last)[inverse]
+    return start, end, is_range[inverse]
+
+
+class Columns:
+    """
+    Columnar store built once from db.records.
+
+    Attributes
+    ----------
+    size : int
+        Number of records
+    start, end : numpy datetime64[D] arrays
+        First/last date of value (NaT if unparseable)
+    is_range : numpy bool array
+        True if value is a 'start - end' range
+    id : numpy float array
+        The id (nan if None) -- ids are all distinct, so not worth encoding
+    codes : dict of numpy int arrays
+        Dictionary-encoded encoded_fields, keyed on field name
+    categories : dict of lists
+        The distinct values for each encoded field, indexed by code
+    refname_row : dict
+        Exact refname -> row index
+    refname_fold : dict
+        Lower-cased refname -> list of row indices
+    """
+
+    def __init__(self, records):
+        values = records.value
+        self.size = len(values)
+        self._shared = False
+        self.start, self.end, self.is_range = split_values(values)
+        self.id = to_numbers(records.id)
+        self.codes = {}
+        self.categories = {}
+        self._lookup = {}
+        for field in encoded_fields:
+            self.categories[field] = []
+            self._lookup[field] = {}
+            self.codes[field] = np.fromiter((self.encode(field, x)
+                                             for x in getattr(records, field)),
+                                            dtype=np.int32, count=self.size)
+        self.refname_row = {}
+        self.refname_fold = {}
+        for i, refname in enumerate(records.refname):
+            self.index_refname(i, refname)
+
+    def to_arrays(self):
+        """
+        The columns as a dict of arrays (and category lists), for pd_snapshot.
+        from_arrays is the inverse.
+        """
+        arrays = {'start': self.start, 'end': self.end, 'is_range': self.is_range, 'id': self.id}
+        for field in encoded_fields:
+            arrays['codes_' + field] = self.codes[field]
+            arrays['categories_' + field] = self.categories[field]
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, records, arrays):
+        """Make the Columns of records from to_arrays output, without reparsing."""
+        self = cls.__new__(cls)
+        self.size = len(records.refname)
+        self._shared = False
+        self.start = arrays['start']
+        self.end = arrays['end']
+        self.is_range = arrays['is_range']
+        self.id = arrays['id']
+        self.codes = {}
+        self.categories = {}
+        self._lookup = {}
+        for field in encoded_fields:
+            self.codes[field] = arrays['codes_' + field]
+            self.categories[field] = []
+            self._lookup[field] = {}
+            for val in arrays['categories_' + field]:
+                self.encode(field, val)
+        self.refname_row = {}
+        self.refname_fold = {}
+        for i, refname in enumerate(records.refname):
+            self.index_refname(i, refname)
+        return self
+
+    def share(self):
+        """
+        Read-only views of the start/end/is_range arrays and the codes (keyed codes_<field>),
+        for pd_frames.  Until they are dropped, set_row copies the arrays before patching them,
+        so the views keep the data as it was.
+        """
+        self._shared = True
+        views = {'start': self.start, 'end': self.end, 'is_range': self.is_range, 'id': self.id}
+        for field in encoded_fields:
+            views['codes_' + field] = self.codes[field]
+        for name, arr in views.items():
+            views[name] = arr.view()
+            views[name].flags.writeable = False
+        return views
+
+    def _unshare(self):
+        """Take copies of the arrays handed out by share."""
+        self.start = self.start.copy()
+        self.end = self.end.copy()
+        self.is_range = self.is_range.copy()
+        self.id = self.id.copy()
+        for field in encoded_fields:
+            self.codes[field] = self.codes[field].copy()
+        self._shared = False
+
+    @property
+    def value_date(self):
+        """The value as a single date (NaT for ranges), as used by make_find_stats."""
+        return np.where(self.is_range, NaT, self.start)
+
+    @property
+    def valid(self):
+        """Records with a parseable (first) date."""
+        return ~np.isnat(self.start)
+
+    def get_datetime(self, i, which='start'):
+        """Return the start/end date of record i as a datetime.datetime (None if NaT)."""
+        day = getattr(self, which)[i]
+        if np.isnat(day):
+            return None
+        return day.astype('datetime64[us]').item()
+
+    def index_refname(self, i, refname):
+        """Add row i to the refname indexes."""
+        self.refname_row[refname] = i
+        self.refname_fold.setdefault(refname.lower(), []).append(i)
+
+    def set_row(self, i, **fields):
+        """Patch row i with the given records field values."""
+        if self._shared:
+            self._unshare()
+        if 'value' in fields:
+            self.start[i], self.end[i], self.is_range[i] = split_value(fields['value'])
+        if 'id' in fields:
+            self.id[i] = to_number(fields['id'])
+        for field in encoded_fields:
+            if field in fields:
+                self.codes[field][i] = self.encode(field, fields[field])
+
+    def append_rows(self, rows):
+        """Append rows (dicts of records field values, including refname) to the columns."""
+        if not len(rows):
+            return
+        start, end, is_range = split_values([row.get('value') for row in rows])
+        self.start = np.concatenate([self.start, start])
+        self.end = np.concatenate([self.end, end])
+        self.is_range = np.concatenate([self.is_range, is_range])
+        self.id = np.concatenate([self.id, to_numbers([row.get('id') for row in rows])])
+        for field in encoded_fields:
+            new_codes = np.array([self.encode(field, row.get(field)) for row in rows],
+                                 dtype=np.int32)
+            self.codes[field] = np.concatenate([self.codes[field], new_codes])
+        for j, row in enumerate(rows):
+            self.index_refname(self.size + j, row['refname'])
+        self.size += len(rows)
+        self._shared = False  # the concatenations are new arrays
+
+    def encode(self, field, val):
+        """Return the code for val in field, adding a new category if needed."""
+        key = pd_utils.stringify(val) if isinstance(val, list) else val
+        try:
+            return self._lookup[field][key]
+        except KeyError:
+            code = len(self.categories[field])
+            self._lookup[field][key] = code
+            self.categories[field].append(val)
+            return code
+
+    def decode(self, field, codes=None):
+        """Return the values of field (for the given codes, default all)."""
+        if codes is None:
+            codes = self.codes[field]
+        cats = self.categories[field]
+        return [cats[c] for c in codes]
+
+
+def base_status(status, ganttable_status):
+    """
+    Return the status_code check_ganttable_status assigns from the status string alone,
+    i.e. before a past date turns it 'late'.
+    """
+    if status is None or status.lower().startswith('no') or not len(status.split()):
+        return 'none'
+    status_code = status.lower().split()[0]
+    if status_code not in ganttable_status.keys():
+        status_code = 'unknown'
+    return status_code
+
+
+def parse_status(status, ganttable_status):
+    """
+    Return what check_ganttable_status takes from the status string alone:
+        (status_code before lateness, lag, status date, color)
+    lag is in days;  it is None if the status gives a date instead, in which case the lag
+    is that date less the record's date.
+    """
+    status_code = base_status(status, ganttable_status)
+    tcode = ganttable_status[status_code]
+    if status_code == 'removed':
+        return status_code, 0.0, None, tcode
+    if status is None or status.lower().startswith('no') or not len(status.split()):
+        parts = status
+    else:
+        parts = status.lower().split()
+    lag, status_date = 0.0, None
+    if parts is not None and len(parts) == 2:
+        try:
+            lag = float(parts[1])
+        except ValueError:
+            status_date = pd_dates.parse_ymd(parts[1])
+            if status_date is not None:
+                lag = None
+            else:
+                tcode = parts[1]
+    return status_code, lag, status_date, tcode
+
+
+class StatusSnapshot:
+    """
+    check_ganttable_status for all records at once, as of one time.
+
+    Attributes
+    ----------
+    as_of : datetime.datetime
+        Time at which lateness was evaluated
+    names : list
+        Status names (the ganttable_status keys), indexed by code
+    code : numpy int array
+        Status code of each record
+    lag : numpy float array
+        Lag in days of each record (nan if unknown)
+    color : numpy object array
+        Color of each record (a ganttable_status color, or lag2rgb for completes)
+    """
+
+    def __init__(self, columns, ganttable_status, dates, as_of):
+        self.as_of = as_of
+        self.names = list(ganttable_status.keys())
+        parsed = [parse_status(x, ganttable_status) for x in columns.categories['status']]
+        cat = columns.codes['status']
+        base = np.array([self.names.index(x[0]) for x in parsed], dtype=np.int32)[cat]
+        lag = np.array([np.nan if x[1] is None else x[1] for x in parsed], dtype=float)[cat]
+        status_date = np.array([NaT if x[2] is None else np.datetime64(x[2].date(), 'D')
+                                for x in parsed], dtype='datetime64[D]')[cat]
+        colors = np.empty(len(parsed), dtype=object)
+        for i, x in enumerate(parsed):
+            colors[i] = x[3]
+        self.color = colors[cat]
+        dated = ~np.isnat(status_date)
+        lag[dated] = (status_date[dated] - dates[dated]) / np.timedelta64(1, 'D')
+        self.lag = lag
+
+        complete = self.names.index('complete')
+        removed = base == self.names.index('removed')
+        late = (dates < np.datetime64(as_of)) & (base != complete) & ~removed
+        self.code = base.copy()
+        self.code[late] = self.names.index('late')
+        self.color[late] = ganttable_status['late']
+        is_complete = self.code == complete
+        lags, inverse = np.unique(self.lag[is_complete], return_inverse=True)
+        rgb = np.empty(len(lags), dtype=object)
+        for i, x in enumerate(lags):
+            rgb[i] = pd_gantt.lag2rgb(x)
+        self.color[is_complete] = rgb[inverse.reshape(-1)]
+
+    def status(self, i):
+        """The (status_code, color) check_ganttable_status returns for record i."""
+        return (self.names[self.code[i]], self.color[i])
+
+
+def stats_status(status, stat_types):
+    """
+    Return the (stat type index, net, ave) make_find_stats counts for a (non-None) status:
+    the first of stat_types within the status, and its number if it has one.
+    The index is -1 if no stat type is in status (uncounted).
+    """
+    for j, stat_type in enumerate(stat_types):
+        if stat_type in status.lower():
+            break
+    else:
+        return -1, 0, 0.0
+    try:
+        return j, 1, float(status.split()[1])
+    except (ValueError, IndexError):
+        return j, 0, 0.0
+
+
+def group_by(keys, nkeys, **weights):
+    """
+    Sum weights grouped on integer keys (0 to nkeys-1) with one bincount each.
+    Returns a dict with 'cnt' (the group sizes) and the sum of each weight.
+    """
+    grouped = {'cnt': np.bincount(keys, minlength=nkeys)}
+    for name, w in weights.items():
+        grouped[name] = np.bincount(keys, weights=w, minlength=nkeys)
+    return grouped
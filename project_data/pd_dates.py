@@ -0,0 +1,93 @@
+"""
+Date parsing shared by the modules:  a fast path for the numeric layouts used throughout
+(yy/mm/dd, yyyy/mm/dd and the m/d/y ones of pd_tools) that falls back to strptime for
+anything it can't decide, memoized on the string, plus a batch parse to datetime64.
+"""
+import datetime
+import functools
+import numpy as np
+
+NaT = np.datetime64('NaT', 'D')
+ymd_formats = ['%y/%m/%d', '%Y/%m/%d']
+
+# field order and digit counts of the layouts the fast path knows
+_layouts = {'%y/%m/%d': 'ymd', '%Y/%m/%d': 'Ymd', '%m/%d/%y': 'mdy', '%m/%d/%Y': 'mdY'}
+_ndigits = {'y': (2,), 'Y': (4,), 'm': (1, 2), 'd': (1, 2)}
+_unsure = object()
+
+
+def _fast_parse(timestr, layout):
+    """
+    Parse timestr in layout as strptime would, returning the datetime, None if strptime
+    would fail, or _unsure if it has to be left to strptime (e.g. padded with spaces).
+    """
+    parts = timestr.split('/')
+    if len(parts) != 3:
+        return None
+    fields = {}
+    for code, part in zip(layout, parts):
+        if not (part.isascii() and part.isdigit()):
+            return _unsure
+        if len(part) not in _ndigits[code]:
+            return None
+        fields[code] = int(part)
+    if 'y' in fields:  # as %y:  69-99 are 1900s, 00-68 2000s
+        fields['Y'] = fields['y'] + (1900 if fields['y'] >= 69 else 2000)
+    try:
+        return datetime.datetime(fields['Y'], fields['m'], fields['d'])
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=65536)
+def parse(timestr, fmt):
+    """Return datetime.strptime(timestr, fmt), or None if it doesn't parse."""
+    if fmt in _layouts:
+        timeval = _fast_parse(timestr, _layouts[fmt])
+        if timeval is not _unsure:
+            return timeval
+    try:
+        return datetime.datetime.strptime(timestr, fmt)
+    except ValueError:
+        return None
+
+
+def parse_ymd(timestr):
+    """Parse a yy/mm/dd or yyyy/mm/dd string (surrounding space ignored), None if neither."""
+    timestr = timestr.strip()
+    for fmt in ymd_formats:
+        timeval = parse(timestr, fmt)
+        if timeval is not None:
+            return timeval
+    return None
+
+
+def to_datetime64(timestrs):
+    """
+    Parse a sequence of yy/mm/dd or yyyy/mm/dd strings to a datetime64[D] array (NaT where
+    None or not a date).  Each distinct string is parsed once.
+    """
+    uniq = {}
+    inverse = np.fromiter((uniq.setdefault(x, len(uniq)) for x in timestrs), dtype=np.int64,
+                          count=len(timestrs))
+    days = np.empty(len(uniq), dtype='datetime64[D]')
+    for x, i in uniq.items():
+        timeval = None if x is None else parse_ymd(x)
+        days[i] = NaT if timeval is None else np.datetime64(timeval.date(), 'D')
+    return days[inverse]
+
+
+@functools.lru_cache(maxsize=65536)
+def ymd_triplet(yymmdd):
+    """
+    Return (year, month, day) of a yy/mm/dd or yyyy/mm/dd string, taking years below 1000
+    as 2000+ (as the gantt charts always have).
+    """
+    dlist = yymmdd.split('/')
+    if len(dlist) < 3:
+        print('error  ', dlist)
+    if int(dlist[0]) < 1000:
+        yr = 2000 + int(dlist[0])
+    else:
+        yr = int(dlist[0])
+    return yr, int(dlist[1]), int(dlist[2])
@@ -0,0 +1,235 @@
+"""
+Streaming export of records (from the in-memory columns) or of whole tables (straight from a
+sqlite cursor) to csv, jsonl or parquet, a chunk of rows at a time so memory stays bounded.
+
+Besides the records fields, a records export can include the joins
+    updated :  list of the record's updated rows {updated, by, note, previous}
+    trace :  list of the record's trace rows {tracename, tracetype, comment}
+    last_updated :  latest updated date of the record
+which are written as json text in csv, lists of objects in jsonl and lists of structs in
+parquet.  Parquet needs pyarrow (only imported when used).
+
+Any other extension gets the one-line-per-record text layout fileout has always written.
+"""
+import csv
+import json
+import os
+
+formats = ['csv', 'jsonl', 'parquet', 'txt']
+joins = {'updated': ['updated', 'by', 'note', 'previous'],
+         'trace': ['tracename', 'tracetype', 'comment'],
+         'last_updated': None}
+default_chunk = 10000
+
+
+def file_format(filename, fmt=None):
+    """Export format for filename:  fmt if given, else from the extension (default txt)."""
+    if fmt is None:
+        fmt = os.path.splitext(filename)[1][1:].lower()
+        fmt = {'json': 'jsonl', 'pq': 'parquet'}.get(fmt, fmt)
+    if fmt not in formats:
+        fmt = 'txt'
+    return fmt
+
+
+def _chunks(n, chunk):
+    for c0 in range(0, n, chunk):
+        yield c0, min(c0 + chunk, n)
+
+
+def record_chunks(data, view, columns, chunk=default_chunk):
+    """
+    Yield {column: list} for successive chunks of the view (record indices) of Data data,
+    with columns records fields and/or joins (and _index, the record indices).
+    """
+    view = list(view)
+    for c0, c1 in _chunks(len(view), chunk):
+        rows = view[c0:c1]
+        block = {'_index': rows}
+        for col in columns:
+            if col in data.db.tables['records'].cols:
+                values = getattr(data.db.records, col)
+                block[col] = [values[i] for i in rows]
+                continue
+            refnames = [data.db.records.refname[i] for i in rows]
+            if col == 'last_updated':
+                updated = data.db.updated.updated
+                block[col] = [max([updated[j] for j in data.updated_collate.get(r, [])
+                                   if updated[j] is not None], default=None) for r in refnames]
+                continue
+            table = getattr(data.db, col)
+            collate = getattr(data, col + '_collate')
+            fields = [(k, getattr(table, k)) for k in joins[col]]
+            block[col] = [[{k: values[j] for k, values in fields} for j in collate.get(r, [])]
+                          for r in refnames]
+        yield block
+
+
+def cursor_chunks(cursor, chunk=default_chunk):
+    """Yield {column: list} for successive fetchmany chunks of an executed sqlite cursor."""
+    cols = [x[0] for x in cursor.description]
+    while True:
+        rows = cursor.fetchmany(chunk)
+        if not rows:
+            return
+        yield dict(zip(cols, [list(x) for x in zip(*rows)]))
+
+
+class CsvWriter:
+    def __init__(self, filename, columns, types=None):
+        self.fp = open(filename, 'w', newline='')
+        self.csvw = csv.writer(self.fp)
+        self.csvw.writerow(columns)
+        self.columns = columns
+
+    def write(self, block):
+        cols = []
+        for col in self.columns:
+            if col in joins and joins[col] is not None:
+                cols.append([json.dumps(x) for x in block[col]])
+            else:
+                cols.append(block[col])
+        self.csvw.writerows(zip(*cols))
+
+    def close(self):
+        self.fp.close()
+
+
+class JsonlWriter:
+    def __init__(self, filename, columns, types=None):
+        self.fp = open(filename, 'w')
+        self.columns = columns
+
+    def write(self, block):
+        for row in zip(*[block[col] for col in self.columns]):
+            self.fp.write(json.dumps(dict(zip(self.columns, row)), default=str) + '\n')
+
+    def close(self):
+        self.fp.close()
+
+
+class TxtWriter:
+    """The fileout text layout:  value (owner) description:  status   (index)."""
+    def __init__(self, filename, columns, types=None):
+        self.fp = open(filename, 'w')
+
+    def write(self, block):
+        for rec in zip(block['value'], block['owner'], block['description'], block['status'],
+                       block['_index']):
+            self.fp.write('{} ({!s:8}) {}:  {}   ({})\n'.format(*rec))
+
+    def close(self):
+        self.fp.close()
+
+
+class ParquetWriter:
+    def __init__(self, filename, columns, types):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("parquet export needs pyarrow")
+        self.pa = pyarrow
+        self.schema = pyarrow.schema([(col, self._arrow_type(types[col])) for col in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(filename, self.schema)
+
+    def _arrow_type(self, sqltype):
+        """Arrow type for a declared sqlite type, or for a join a list of its fields' types."""
+        if isinstance(sqltype, dict):
+            return self.pa.list_(self.pa.struct([(k, self._arrow_type(v))
+                                                 for k, v in sqltype.items()]))
+        sqltype = (sqltype or '').upper()
+        if 'INT' in sqltype:
+            return self.pa.int64()
+        if 'REAL' in sqltype or 'FLOA' in sqltype or 'DOUB' in sqltype:
+            return self.pa.float64()
+        return self.pa.string()
+
+    def write(self, block):
+        arrays = []
+        for field in self.schema:
+            values = block[field.name]
+            if field.type == self.pa.string():  # anything not text (e.g. a list) as its str
+                values = [x if x is None or isinstance(x, str) else str(x) for x in values]
+            arrays.append(self.pa.array(values, type=field.type))
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+txt_columns = ['value', 'owner', 'description', 'status']
+writers = {'csv': CsvWriter, 'jsonl': JsonlWriter, 'parquet': ParquetWriter, 'txt': TxtWriter}
+
+
+def declared_types(conn, table):
+    """{column: declared sqlite type} of table."""
+    return {x[1]: x[2] for x in conn.execute('PRAGMA table_info({})'.format(table))}
+
+
+def record_types(conn, columns):
+    """Declared sqlite types of records columns (dicts of the joined fields for joins)."""
+    types = declared_types(conn, 'records')
+    updated = declared_types(conn, 'updated')
+    for col in columns:
+        if col == 'last_updated':
+            types[col] = updated['updated']
+        elif col in joins:
+            table = declared_types(conn, col)
+            types[col] = {k: table.get(k) for k in joins[col]}
+    return types
+
+
+def write_chunks(filename, fmt, columns, types, chunks):
+    """Write the chunks ({column: list}) with the writer for fmt;  returns the rows written."""
+    writer = writers[fmt](filename, columns, types)
+    nrows = 0
+    try:
+        for block in chunks:
+            writer.write(block)
+            nrows += len(block[columns[0]])
+    finally:
+        writer.close()
+    return nrows
+
+
+def export_table(conn, table, filename, fmt=None, columns=None, order_by=None,
+                 chunk=default_chunk):
+    """
+    Stream a database table to filename through a sqlite cursor.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database
+    table : str
+        Table to export (e.g. updated for the full history)
+    filename : str
+        File to write
+    fmt : str or None
+        csv, jsonl or parquet (default from the extension)
+    columns : list or None
+        Columns to export [all]
+    order_by : str or None
+        Column to order the rows by [rowid]
+    chunk : int
+        Rows fetched and written at a time
+
+    Returns
+    -------
+    int
+        Number of rows written
+    """
+    fmt = file_format(filename, fmt)
+    if fmt == 'txt':
+        raise ValueError("Tables export as csv, jsonl or parquet, not {}".format(filename))
+    types = declared_types(conn, table)
+    if columns is None:
+        columns = list(types.keys())
+    for col in columns:
+        if col not in types:
+            raise ValueError("{} not a column of {}.".format(col, table))
+    cursor = conn.execute('SELECT {} FROM {} ORDER BY {}'.format(
+        ', '.join(['"{}"'.format(x) for x in columns]), table,
+        'rowid' if order_by is None else '"{}"'.format(order_by)))
+    return write_chunks(filename, fmt, columns, types, cursor_chunks(cursor, chunk))
@@ -0,0 +1,141 @@
+"""
+NumPy, Arrow and pandas access to the records, updated and trace tables of a Data, built on
+its columns rather than by iterating db.records.
+
+What is shared and what is copied:
+  - the records dates (start, end, is_range) and the codes of the encoded fields are the
+    Columns buffers themselves (read-only, see Columns.share), and the Arrow dictionary and
+    pandas Categorical columns are built on those codes.
+  - the other fields (and the updated/trace tables) are python lists, so they are turned
+    into object arrays once (pointers to the same strings) and cached until the data change.
+  - Arrow copies text into its own buffers and dates to date32, pandas converts the dates to
+    datetime64[s] and may narrow the codes, and a structured array interleaves the fields,
+    so those are copies.
+  - a view (e.g. find results) is a take of just those rows, so only they are copied.
+pyarrow and pandas are imported only when used.
+"""
+import numpy as np
+from project_data import pd_columns, pd_utils
+
+tables = ['records', 'updated', 'trace']
+dictionary_fields = pd_columns.encoded_fields
+
+
+def _object_array(values):
+    return np.fromiter(values, dtype=object, count=len(values))
+
+
+def _text(values):
+    """values with anything not a str (e.g. a list) as its string, None kept."""
+    return [x if x is None or isinstance(x, str) else pd_utils.stringify(x) for x in values]
+
+
+def _cache(data, table):
+    if table not in tables:
+        raise ValueError("{} not one of {}.".format(table, ', '.join(tables)))
+    return data._frame_cache.setdefault(table, {})
+
+
+def arrays(data, table='records'):
+    """
+    Return {column: numpy array} of table (cached until the data change).  For records the
+    encoded fields are decoded from their codes, and start/end/is_range are added.
+    """
+    cache = _cache(data, table)
+    if 'numpy' not in cache:
+        cols = {}
+        tbl = getattr(data.db, table)
+        if table == 'records':
+            shared = data.columns.share()
+            for col in data.db.tables[table].cols:
+                if col in pd_columns.encoded_fields:
+                    cats = _object_array(data.columns.categories[col])
+                    cols[col] = cats[shared['codes_' + col]]
+                else:
+                    cols[col] = _object_array(getattr(tbl, col))
+            for col in ['start', 'end', 'is_range']:
+                cols[col] = shared[col]
+        else:
+            for col in data.db.tables[table].cols:
+                cols[col] = _object_array(getattr(tbl, col))
+        cache['numpy'] = cols
+    return cache['numpy']
+
+
+def _take(view):
+    if view is None or (isinstance(view, str) and view == 'all'):
+        return None
+    return np.asarray(view, dtype=np.intp)
+
+
+def to_numpy(data, table='records', view=None, structured=False):
+    """
+    Return table as {column: array}, or as one structured array (a copy) if structured.
+    view selects rows by index (e.g. find results).
+    """
+    cols = arrays(data, table)
+    idx = _take(view)
+    if idx is not None:
+        cols = {k: v[idx] for k, v in cols.items()}
+    if not structured:
+        return dict(cols)
+    nrows = len(next(iter(cols.values())))
+    out = np.empty(nrows, dtype=[(k, v.dtype) for k, v in cols.items()])
+    for k, v in cols.items():
+        out[k] = v
+    return out
+
+
+def to_arrow(data, table='records', view=None):
+    """Return table as a pyarrow Table (records encoded fields as dictionary arrays)."""
+    import pyarrow as pa
+    cache = _cache(data, table)
+    if 'arrow' not in cache:
+        cols = arrays(data, table)
+        names, columns = [], []
+        for col, values in cols.items():
+            if table == 'records' and col in dictionary_fields:
+                codes = data.columns.share()['codes_' + col]
+                dictionary = pa.array(_text(data.columns.categories[col]), type=pa.string())
+                columns.append(pa.DictionaryArray.from_arrays(pa.array(codes), dictionary))
+            elif values.dtype != object or col == 'id':
+                columns.append(pa.array(values))
+            else:
+                columns.append(pa.array(_text(values), type=pa.string()))
+            names.append(col)
+        cache['arrow'] = pa.Table.from_arrays(columns, names=names)
+    idx = _take(view)
+    if idx is None:
+        return cache['arrow']
+    return cache['arrow'].take(pa.array(idx))
+
+
+def to_pandas(data, table='records', view=None):
+    """
+    Return table as a pandas DataFrame indexed by row (records encoded fields as Categorical).
+    A view keeps the row indices as the index.
+    """
+    import pandas as pd
+    cache = _cache(data, table)
+    if 'pandas' not in cache:
+        cols = arrays(data, table)
+        frame = {}
+        for col, values in cols.items():
+            if table == 'records' and col in dictionary_fields:
+                cats = data.columns.categories[col]
+                codes = data.columns.share()['codes_' + col]
+                if None in cats:  # pandas has no None category, it's code -1
+                    none = cats.index(None)
+                    codes = np.where(codes == none, -1, codes - (codes > none))
+                    cats = cats[:none] + cats[none + 1:]
+                cats = [pd_utils.stringify(x) if isinstance(x, list) else x for x in cats]
+                frame[col] = pd.Categorical.from_codes(codes, categories=cats)
+            elif values.dtype == object:
+                frame[col] = pd.Series(values, dtype=object, copy=False)
+            else:
+                frame[col] = values
+        cache['pandas'] = pd.DataFrame(frame, copy=False)
+    idx = _take(view)
+    if idx is None:
+        return cache['pandas'].copy(deep=False)
+    return cache['pandas'].take(idx)
@@ -4,13 +4,22 @@ Adapted from https://bitbucket.org/DBrent/phd/src/1d1c5444d2ba2ee3918e0dfd5e886e
 BHC 2014
 
 Adapted by ddeboer 6/Feb/2015
+
+matplotlib is only imported when something is drawn (lag2rgb etc don't need it).
 """
 from __future__ import absolute_import, print_function
 import datetime as dt
-import matplotlib.pyplot as plt
-import matplotlib.dates
-from matplotlib.dates import MONTHLY, DateFormatter, rrulewrapper, RRuleLocator
 import numpy as np
+from project_data import pd_dates, pd_profile
+
+
+def pyplot():
+    """Import and return matplotlib.pyplot (on first use), without its deprecation warnings."""
+    import warnings
+    from matplotlib import MatplotlibDeprecationWarning
+    import matplotlib.pyplot as plt
+    warnings.filterwarnings("ignore", category=MatplotlibDeprecationWarning)
+    return plt
 
 
 def check_gantt_labels(label, labels):
@@ -23,15 +32,8 @@ def check_gantt_labels(label, labels):
 
 def __create_date(yymmdd, return_triplet=False):
     """Creates the date from yy/mm/dd"""
-    dlist = yymmdd.split('/')
-    if len(dlist) < 3:
-        print('error  ', dlist)
-    if int(dlist[0]) < 1000:
-        yr = 2000 + int(dlist[0])
-    else:
-        yr = int(dlist[0])
-    mn = int(dlist[1])
-    dy = int(dlist[2])
+    import matplotlib.dates
+    yr, mn, dy = pd_dates.ymd_triplet(yymmdd)
     date = dt.datetime(yr, mn, dy)
     mdate = matplotlib.dates.date2num(date)
     if return_triplet:
@@ -54,14 +56,66 @@ def get_key(p, task_dates):
     return None
 
 
-def plotGantt(ylabels, dates, predecessors=None, status_codes=None, show_cdf=True, other_labels=None):  # noqa
+def resolve_predecessors(predecessors, ylabels):
+    """
+    Return the (row, predecessor row) pairs for predecessors given as a list of labels per
+    ylabel.  Labels are looked up exactly, falling back to the first ylabel containing them.
+    """
+    rows = {}
+    for i, lbl in enumerate(ylabels):
+        rows.setdefault(lbl, i)
+    pairs = []
+    for i, preds in enumerate(predecessors):
+        for p in preds:
+            if not len(p):
+                continue
+            if p not in rows:
+                rows[p] = get_index(p, ylabels)
+            if rows[p] is not None:
+                pairs.append((i, rows[p]))
+    return pairs
+
+
+def new_figure(figsize=(9, 8)):
+    """
+    Return a Figure on an Agg canvas, for drawing and saving without pyplot (so headless, and
+    nothing is kept in pyplot's figure list).  Reuse it with fig.clear().
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=figsize, tight_layout=True)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _format_date_axis(ax):
+    from matplotlib.dates import MONTHLY, DateFormatter, rrulewrapper, RRuleLocator
+    ax.xaxis_date()  # Tell matplotlib that these are dates...
+    rule = rrulewrapper(MONTHLY, interval=1)
+    loc = RRuleLocator(rule)
+    formatter = DateFormatter("%b '%y")
+    ax.xaxis.set_major_locator(loc)
+    ax.xaxis.set_major_formatter(formatter)
+    ax.tick_params(axis='x', labelrotation=30, labelsize=12)
+
+
+@pd_profile.timed('plotGantt')
+def plotGantt(ylabels, dates, predecessors=None, status_codes=None, show_cdf=True, other_labels=None,  # noqa
+              predecessor_pairs=None, fig=None, cdf_fig=None, as_of=None):
     """
     This will plot a gantt chart of items (ylabels) and dates.  If included, it will plot percent
     complete for tasks and color code for milestones (note, if included, it must have a status_codes
-    entry for every label)  If included, it will connect predecessors (note, if included, it also
-    must have an entry for every ylabel) other_labels prints another label by the entry (to right on
-    plot), it also must have an entry for every ylabel
+    entry for every label;  without them there is no cdf)  If included, it will connect predecessors
+    (note, if included, it also must have an entry for every ylabel) other_labels prints another
+    label by the entry (to right on plot), it also must have an entry for every ylabel.
+    predecessor_pairs are links already resolved to (row, predecessor row) index pairs.
+    fig/cdf_fig are figures to draw the chart/cdf on (cleared first), e.g. from new_figure;
+    if None, new pyplot figures are made.  as_of is the time the status_codes were judged at (the
+    "now" line and the end of the cdf), default now.
     """
+    import matplotlib.dates
+    import matplotlib.colors
+    from matplotlib.collections import LineCollection, PolyCollection
     # Check data
     if len(ylabels) != len(dates) or status_codes is not None and len(status_codes) != len(ylabels):
         print('Data not in correct format.')
@@ -99,139 +153,126 @@ def plotGantt(ylabels, dates, predecessors=None, status_codes=None, show_cdf=Tru
         date_max = matplotlib.dates.date2num(dt.datetime(yrmax, mnmax, 28))
 
     # Initialise plot
-    fig1 = plt.figure(figsize=(9, 8), tight_layout=True)
+    if fig is None:
+        fig1 = pyplot().figure(figsize=(9, 8), tight_layout=True)
+    else:
+        fig1 = fig
+        fig1.clear()
     ax1 = fig1.add_subplot(111)
     ax1.axis(xmin=date_min, xmax=date_max)
     step = 0.5
     ymin = step
     ymax = len(ylabels) * step
 
-    # Plot the data
-    for i in range(0, len(ylabels)):
-        start_date, end_date = task_dates[ylabels[i]]
-        if start_date == end_date:  # Milestone
-            clr = status_codes[i][1]
-            mkr = 'D'
-            plt.plot(end_date, i * step + ymin, mkr, color=clr, markersize=8)
+    # Plot the data:  all milestones in one scatter, all task bars in one collection
+    starts = np.array([task_dates[lbl][0] for lbl in ylabels])
+    ends = np.array([task_dates[lbl][1] for lbl in ylabels])
+    ypos = np.arange(len(ylabels)) * step + ymin
+    milestone = starts == ends
+    if milestone.any():
+        if status_codes is None:
+            clr = 'k'
         else:
-            print("Should use the percent complete status_codes for color etc.")
-            plt.barh(i * step + ymin, end_date - start_date, left=start_date, height=0.3,
-                     align='center', color='blue', alpha=0.75)
+            clr = matplotlib.colors.to_rgba_array([status_codes[i][1]
+                                                   for i in np.flatnonzero(milestone)])
+        ax1.scatter(ends[milestone], ypos[milestone], marker='D', c=clr, s=64)
+    if not milestone.all():
+        print("Should use the percent complete status_codes for color etc.")
+        half = 0.3 / 2.0
+        bars = [[(s, y - half), (s, y + half), (e, y + half), (e, y - half)]
+                for s, e, y in zip(starts[~milestone], ends[~milestone], ypos[~milestone])]
+        ax1.add_collection(PolyCollection(bars, facecolors='blue', alpha=0.75))
 
     # Format the y-axis
     pos = np.arange(ymin, ymax + step / 2.0, step)  # add the step/2.0 to get that last value
-    locsy, labelsy = plt.yticks(pos, ylabels)
-    plt.setp(labelsy, fontsize=14)
-    plt.grid(color='g', linestyle=':')
+    ax1.set_yticks(pos)
+    ax1.set_yticklabels(ylabels, fontsize=14)
+    ax1.grid(color='g', linestyle=':')
 
     # Plot current time
-    now = dt.datetime.now()
+    now = dt.datetime.now() if as_of is None else as_of
     now_date = matplotlib.dates.date2num(now)
-    plt.plot([now_date, now_date], [ymin - step, ymax + step], 'k--')
+    ax1.plot([now_date, now_date], [ymin - step, ymax + step], 'k--')
 
     # Plot other_labels if present
     if other_labels is not None:
         for i in range(0, len(ylabels)):
-            start_date, end_date = task_dates[ylabels[i]]
-            plt.text(end_date + 5, i * step + ymin, str(other_labels[i]))
+            ax1.text(ends[i] + 5, ypos[i], str(other_labels[i]))
 
-    # Plot predecessors
+    # Plot predecessors:  each link is a (row, predecessor row) pair
+    links = []
+    if predecessor_pairs is not None:
+        links += [tuple(x) for x in predecessor_pairs]
     if predecessors is not None:
-        for i, k in enumerate(ylabels):
-            yk = i * step + ymin
-            xk = task_dates[k][0]
-            for p in predecessors[i]:
-                if len(p) > 0:
-                    j = get_index(p, ylabels)
-                    if j is None:
-                        continue
-                    yp = j * step + ymin
-                    k = get_key(p, task_dates)
-                    if k is None:
-                        continue
-                    xp = task_dates[k][1]
-                    # xp = task_dates[p][1]
-                    ykp = [yk, yk, yp]
-                    xkp = [xk, xp, xp]
-                    plt.plot(xkp, ykp, color='b', linewidth=3)
-
-    ax1.xaxis_date()  # Tell matplotlib that these are dates...
-    rule = rrulewrapper(MONTHLY, interval=1)
-    loc = RRuleLocator(rule)
-    formatter = DateFormatter("%b '%y")
-    ax1.xaxis.set_major_locator(loc)
-    ax1.xaxis.set_major_formatter(formatter)
-    labelsx = ax1.get_xticklabels()
-    plt.setp(labelsx, rotation=30, fontsize=12)
+        links += resolve_predecessors(predecessors, ylabels)
+    if len(links):
+        segs = [[(starts[i], ypos[i]), (ends[j], ypos[i]), (ends[j], ypos[j])] for i, j in links]
+        ax1.add_collection(LineCollection(segs, colors='b', linewidths=3))
+
+    _format_date_axis(ax1)
 
     # Finish up
     ax1.invert_yaxis()
     ax1.axis(ymin=ymax + (step - 0.01), ymax=ymin - (step - 0.01))
     fig1.autofmt_xdate()
-    plt.tight_layout()
+    fig1.tight_layout()
 
     # ##---If plotting cdf, check to see if you should---###
     cx_dat = None
     cy_dat = None
     cdf_tot = None
-    if show_cdf:  # First get total number of milestones
-        cdf_tot = 0
-        for i in range(0, len(ylabels)):
-            start_date, end_date = task_dates[ylabels[i]]
-            if start_date == end_date:  # Milestone
-                if start_date > now_date:
-                    continue
-                if status_codes[i][0] != 'removed':
-                    cdf_tot += 1
-            else:
-                print('NOT MILESTONE')
-                show_cdf = False
-                break
+    show_cdf = show_cdf and status_codes is not None  # nothing to count as complete without them
+    if show_cdf:  # First get total number of milestones (up to the first non-milestone)
+        if milestone.all():
+            counted = len(ylabels)
+        else:
+            print('NOT MILESTONE')
+            show_cdf = False
+            counted = int(np.argmin(milestone))
+        stat = np.array([x[0] for x in status_codes[:len(ylabels)]], dtype=object)
+        cdf_tot = int(np.count_nonzero((starts[:counted] <= now_date)
+                                       & (stat[:counted] != 'removed')))
         if not cdf_tot:
             cdf_tot = 1
     if show_cdf:
+        # completed by day xd is the number of complete start dates before it
         cx_dat = np.arange(date_min, now_date, 1.0)
-        cy_dat = []
-        for xd in cx_dat:
-            ctr = 0.0
-            for i in range(0, len(ylabels)):
-                start_date, end_date = task_dates[ylabels[i]]
-                if xd > start_date and status_codes[i][0] == 'complete':
-                    ctr += 1.0
-            cy_dat.append(ctr)  # /len(ylabels))
-        cy_dat = np.array(cy_dat)
-        fig2 = plt.figure('cdf')
+        completed = np.sort(starts[stat == 'complete'])
+        cy_dat = np.searchsorted(completed, cx_dat, side='left').astype(float)
+        if cdf_fig is None:
+            fig2 = pyplot().figure('cdf')
+        else:
+            fig2 = cdf_fig
+            fig2.clear()
         ax2 = fig2.add_subplot(111)
         ax2.axis(xmin=date_min, xmax=date_max, ymin=0.0, ymax=1.0)
-        plt.plot(cx_dat, cy_dat / cdf_tot)
-        plt.ylabel('Fraction Completed')
-        plt.grid()
-        ax2.xaxis_date()  # Tell matplotlib that these are dates...
-        rule = rrulewrapper(MONTHLY, interval=1)
-        loc = RRuleLocator(rule)
-        formatter = DateFormatter("%b '%y")
-        ax2.xaxis.set_major_locator(loc)
-        ax2.xaxis.set_major_formatter(formatter)
-        labelsx = ax2.get_xticklabels()
-        plt.setp(labelsx, rotation=30, fontsize=12)
+        ax2.plot(cx_dat, cy_dat / cdf_tot)
+        ax2.set_ylabel('Fraction Completed')
+        ax2.grid()
+        _format_date_axis(ax2)
     return_info = {'cdf_x': cx_dat, 'cdf_y': cy_dat, 'cdf_tot': cdf_tot}
     return return_info
 
 
-def colorBar():
-    fff = plt.figure('ColorBar')
+def colorBar(fig=None):
+    """Plot the lag color scale, on fig (cleared first) if given, else the 'ColorBar' figure."""
+    if fig is None:
+        fff = pyplot().figure('ColorBar')
+    else:
+        fff = fig
+        fff.clear()
     ax = fff.add_subplot(111)
     ax.set_yticklabels([])
-    plt.xlabel('Days')
+    ax.set_xlabel('Days')
     for j in range(180):
         i = j - 90.0
         c = lag2rgb(i)
-        plt.plot([i], [1.0], 's', markersize=20, color=c, markeredgewidth=0.0, fillstyle='full')
-    ar = plt.axis()
+        ax.plot([i], [1.0], 's', markersize=20, color=c, markeredgewidth=0.0, fillstyle='full')
+    ar = ax.axis()
     boxx = [ar[0], ar[1], ar[1], ar[0], ar[0]]
     boxy = [-5.0, -5.0, 6.0, 6.0, -5.0]
-    plt.plot(boxx, boxy, 'k')
-    plt.axis('image')
+    ax.plot(boxx, boxy, 'k')
+    ax.axis('image')
 
 
 def lag2rgb(lag):
@@ -262,6 +303,7 @@ def lag2rgb(lag):
 
 
 def colorCurve():
+    plt = pyplot()
     plt.figure('ColorCurve')
     plt.xlabel('Days')
     s = 255.0
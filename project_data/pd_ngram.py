@@ -0,0 +1,80 @@
+"""Trigram index for ranked fuzzy lookups of records (see Data.rank_refs)."""
+import numpy as np
+
+
+def normalize(text):
+    if text is None:
+        return ''
+    return ' '.join(str(text).lower().split())
+
+
+def grams(text, n=3):
+    """Set of the n-grams of the normalized text (the text itself if shorter than n)."""
+    text = normalize(text)
+    if len(text) < n:
+        return {text} if len(text) else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class NgramIndex:
+    """
+    Maps each n-gram to the rows containing it.
+
+    Rows are scored against a query by the fraction of the query's n-grams they contain,
+    ties going to the row with the higher Jaccard similarity (i.e. the closer length).
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        self.postings = {}
+        self._arrays = {}
+        self.row_grams = {}
+        self.sizes = np.zeros(0, dtype=np.int64)
+
+    def add(self, row, *texts):
+        """Index row under the n-grams of texts (replacing any it had)."""
+        self.remove(row)
+        these = set()
+        for text in texts:
+            these |= grams(text, self.n)
+        self.row_grams[row] = these
+        if row >= len(self.sizes):
+            grow = max(row + 1 - len(self.sizes), len(self.sizes))
+            self.sizes = np.concatenate([self.sizes, np.zeros(grow, dtype=np.int64)])
+        self.sizes[row] = len(these)
+        for gram in these:
+            self.postings.setdefault(gram, []).append(row)
+            self._arrays.pop(gram, None)
+
+    def remove(self, row):
+        """Remove row from the index."""
+        for gram in self.row_grams.pop(row, []):
+            self.postings[gram].remove(row)
+            self._arrays.pop(gram, None)
+        if row < len(self.sizes):
+            self.sizes[row] = 0
+
+    def _posting(self, gram):
+        if gram not in self._arrays:
+            self._arrays[gram] = np.array(self.postings.get(gram, []), dtype=np.int64)
+        return self._arrays[gram]
+
+    def search(self, text, k=5):
+        """
+        Return up to k (row, score) of the best matching rows, best first.
+        score is the fraction of the n-grams of text found in the row (1.0 is all).
+        """
+        query = grams(text, self.n)
+        if not len(query) or not len(self.row_grams):
+            return []
+        hits = np.concatenate([self._posting(x) for x in query])
+        if not len(hits):
+            return []
+        overlap = np.bincount(hits)
+        rows = np.flatnonzero(overlap)
+        overlap = overlap[rows]
+        sizes = self.sizes[rows]
+        score = overlap / len(query)
+        jaccard = overlap / (len(query) + sizes - overlap)
+        best = np.lexsort((rows, -jaccard, -score))[:k]
+        return [(int(rows[i]), float(score[i])) for i in best]
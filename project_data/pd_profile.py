@@ -0,0 +1,218 @@
+"""
+Named timing spans around the Data pipeline (read_data, the find phases, getview/sort_order,
+make_find_stats, the display methods, plotGantt...), off by default.
+
+When off, span() hands back a shared null context and the timed wrappers make one flag check,
+so leaving them in place costs next to nothing.  When on (enable()), each span's durations are
+kept and report() gives the count, total and percentiles per span name.  enable can also run
+cProfile and/or tracemalloc over the same stretch, see cprofile_stats and memory_stats.
+watch() turns the spans on just for one call, to get its phase timings (see pd_slowlog).
+
+    from project_data import pd_profile
+    pd_profile.enable()
+    pd.find('20/06/01', display='noshow')
+    pd_profile.show()
+"""
+import contextlib
+import functools
+import time
+import numpy as np
+
+enabled = False  # spans are timed (recording or watched)
+durations = {}  # span name: list of seconds
+_recording = False
+_watches = []  # phase dicts of the watched calls in progress
+_null_span = contextlib.nullcontext()
+_profiler = None
+_tracing = False
+_memory_capture = None  # (tracemalloc snapshot, peak bytes)
+
+
+class _Span:
+    __slots__ = ['name', 't0']
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.t0
+        if _recording:
+            durations.setdefault(self.name, []).append(seconds)
+        for phases in _watches:
+            phases[self.name] = phases.get(self.name, 0.0) + seconds
+        return False
+
+
+def span(name):
+    """Context manager timing the enclosed block as name (when enabled)."""
+    if not enabled:
+        return _null_span
+    return _Span(name)
+
+
+def timed(name):
+    """Decorator timing each call of the function as span name (when enabled)."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enable(cprofile=False, memory=False):
+    """
+    Start recording spans (added to any already recorded, see reset).
+
+    Parameters
+    ----------
+    cprofile : bool
+        Also run cProfile until disable()
+    memory : bool
+        Also trace allocations with tracemalloc until disable()
+    """
+    global enabled, _recording, _profiler, _tracing
+    enabled = _recording = True
+    if cprofile:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    if memory:
+        import tracemalloc
+        tracemalloc.start()
+        _tracing = True
+
+
+def disable():
+    """Stop recording spans (and any cProfile/tracemalloc capture);  the results are kept."""
+    global enabled, _recording, _tracing, _memory_capture
+    _recording = False
+    enabled = bool(_watches)
+    if _profiler is not None:
+        _profiler.disable()
+    if _tracing:
+        import tracemalloc
+        _memory_capture = tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        _tracing = False
+
+
+def reset():
+    """Forget the recorded spans and captures."""
+    global _profiler, _memory_capture
+    durations.clear()
+    _profiler = None
+    _memory_capture = None
+
+
+@contextlib.contextmanager
+def profiling(cprofile=False, memory=False):
+    """enable() for the duration of a with block."""
+    enable(cprofile=cprofile, memory=memory)
+    try:
+        yield
+    finally:
+        disable()
+
+
+@contextlib.contextmanager
+def watch():
+    """
+    Time the spans within the with block (whether or not enabled), yielding a dict that
+    collects the total seconds per span name.
+    """
+    global enabled
+    phases = {}
+    _watches.append(phases)
+    enabled = True
+    try:
+        yield phases
+    finally:
+        _watches.pop()  # watches nest, so this is phases
+        enabled = _recording or bool(_watches)
+
+
+def report(percentiles=(50, 90, 99)):
+    """
+    Return {span name: {'count', 'total', 'mean', 'max', 'p50', ...}} (seconds) of the
+    recorded spans.
+    """
+    stats = {}
+    for name, times in durations.items():
+        times = np.asarray(times)
+        this = {'count': len(times), 'total': float(times.sum()), 'mean': float(times.mean()),
+                'max': float(times.max())}
+        for p, v in zip(percentiles, np.percentile(times, percentiles)):
+            this['p{}'.format(p)] = float(v)
+        stats[name] = this
+    return stats
+
+
+def show(percentiles=(50, 90, 99)):
+    """Print the report, slowest total first (times in ms)."""
+    stats = report(percentiles)
+    if not stats:
+        print('No spans recorded (pd_profile.enable() first).')
+        return
+    pcols = ['p{}'.format(p) for p in percentiles]
+    width = max(len(x) for x in stats)
+    print('{:{w}s} {:>7s} {:>10s} {:>9s}'.format('span', 'count', 'total', 'mean', w=width)
+          + ''.join(['{:>9s}'.format(x) for x in pcols + ['max']]))
+    for name, this in sorted(stats.items(), key=lambda x: -x[1]['total']):
+        row = '{:{w}s} {:7d} {:10.2f} {:9.3f}'.format(name, this['count'], 1000 * this['total'],
+                                                      1000 * this['mean'], w=width)
+        print(row + ''.join(['{:9.3f}'.format(1000 * this[x]) for x in pcols + ['max']]))
+
+
+def cprofile_stats(sort='cumulative', limit=25):
+    """Print the cProfile capture (if enable(cprofile=True) was used)."""
+    if _profiler is None:
+        print('No cProfile capture.')
+        return
+    import pstats
+    pstats.Stats(_profiler).sort_stats(sort).print_stats(limit)
+
+
+def memory_stats(limit=15):
+    """Print the peak and the top allocating lines of the tracemalloc capture (after disable)."""
+    if _memory_capture is None:
+        print('No tracemalloc capture (enable(memory=True), then disable()).')
+        return
+    snapshot, peak = _memory_capture
+    print('Peak traced memory:  {:.1f} MB'.format(peak / 1e6))
+    for stat in snapshot.statistics('lineno')[:limit]:
+        print(stat)
+
+
+def add_argument(parser):
+    """Add the --profile option to an argparse parser of a script."""
+    parser.add_argument('--profile', nargs='?', const='spans', default=None,
+                        help="time the pipeline and print the spans at the end;  add "
+                             "'cprofile' and/or 'memory' (comma-separated) for those too")
+
+
+@contextlib.contextmanager
+def from_args(args):
+    """Profile the with block of a script as its --profile option asks, then print it all."""
+    if args.profile is None:
+        yield
+        return
+    extras = args.profile.split(',')
+    enable(cprofile='cprofile' in extras, memory='memory' in extras)
+    try:
+        yield
+    finally:
+        disable()
+        print()
+        show()
+        if 'cprofile' in extras:
+            cprofile_stats()
+        if 'memory' in extras:
+            memory_stats()
@@ -0,0 +1,154 @@
+"""
+Slow-query log:  find/getref/update/gantt calls that take longer than the slow_query_ms state
+variable are appended as json lines to <db>.slow.jsonl, next to the database, with their
+arguments, row count, phase timings (the pd_profile spans) and the number of records.
+It is opt-in (slow_query_ms null by default):  while it is on, the logged calls run inside
+pd_profile.watch() to get their phases, so the spans are timed.  Time spent at a prompt()
+(e.g. update asking who is updating) isn't counted.
+
+report() aggregates a log by query shape (operation, kind of each argument and the keywords
+used), so the kinds of query that are slow in real use stand out;  see scripts/pd_slowlog.py.
+"""
+import datetime
+import functools
+import json
+import time
+import numpy as np
+from project_data import pd_dates, pd_profile
+
+# keywords whose value is part of the query shape (the rest just by name)
+shape_values = ['field', 'match', 'display', 'search', 'method', 'best']
+_waited = 0.0  # seconds spent at prompts, taken off the logged times
+
+
+def log_file(db_file):
+    return db_file + '.slow.jsonl'
+
+
+def _brief(value):
+    """value as logged:  long lists are just counted."""
+    if isinstance(value, (list, tuple, range, np.ndarray)) and len(value) > 10:
+        return '<{} items>'.format(len(value))
+    if isinstance(value, (list, tuple)):
+        return [_brief(x) for x in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _rows(result):
+    if isinstance(result, (list, tuple, range, np.ndarray)):
+        return len(result)
+    if result is None or result is False:
+        return 0
+    return 1
+
+
+def prompt(message):
+    """input(message), with the time waiting for the answer left out of the logged calls."""
+    global _waited
+    t0 = time.perf_counter()
+    try:
+        return input(message)
+    finally:
+        _waited += time.perf_counter() - t0
+
+
+def logged(op, rows=None):
+    """
+    Decorator for Data methods:  log calls slower than self.slow_query_ms (none if that is
+    None/0).  rows(self, result, *args, **kwargs) gives the row count, by default from the
+    result.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            threshold = getattr(self, 'slow_query_ms', None)
+            if not threshold:
+                return func(self, *args, **kwargs)
+            with pd_profile.watch() as phases:
+                t0, waited = time.perf_counter(), _waited
+                result = func(self, *args, **kwargs)
+                seconds = time.perf_counter() - t0 - (_waited - waited)
+            if 1000.0 * seconds >= threshold:
+                entry = {'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                         'op': op, 'ms': round(1000.0 * seconds, 1),
+                         'args': [_brief(x) for x in args],
+                         'kwargs': {k: _brief(v) for k, v in kwargs.items()},
+                         'rows': (_rows(result) if rows is None
+                                  else rows(self, result, *args, **kwargs)),
+                         'records': getattr(self, 'num_records', None),
+                         'phases': {k: round(1000.0 * v, 1) for k, v in phases.items()}}
+                write(log_file(self.inFile), entry)
+            return result
+        return wrapper
+    return decorate
+
+
+def write(filename, entry):
+    try:
+        with open(filename, 'a') as fp:
+            fp.write(json.dumps(entry, default=str, separators=(',', ':')) + '\n')
+    except OSError as e:
+        print("Could not write slow-query log:  {}".format(e))
+
+
+def read(filename):
+    """Return the list of entries in a slow-query log (skipping any broken lines)."""
+    entries = []
+    with open(filename, 'r') as fp:
+        for line in fp:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def _kind(value):
+    if value is None:
+        return 'none'
+    if isinstance(value, str):
+        if value.startswith('<') and value.endswith(' items>'):
+            return 'list'
+        return 'date' if pd_dates.parse_ymd(value) is not None else 'text'
+    if isinstance(value, list):
+        return 'list'
+    return type(value).__name__
+
+
+def shape(entry):
+    """Query shape of a log entry, e.g. find(date,date;display=noshow,dtype,owner)."""
+    kw = []
+    for k in sorted(entry['kwargs']):
+        if k in shape_values:
+            kw.append('{}={}'.format(k, entry['kwargs'][k]))
+        else:
+            kw.append(k)
+    return '{}({};{})'.format(entry['op'], ','.join([_kind(x) for x in entry['args']]),
+                              ','.join(kw))
+
+
+def report(entries):
+    """
+    Aggregate log entries by shape:  returns a list (worst total time first) of dicts with
+    shape, count, total/p50/max ms, mean rows and records, and the phase with most time.
+    """
+    by_shape = {}
+    for entry in entries:
+        by_shape.setdefault(shape(entry), []).append(entry)
+    summary = []
+    for this_shape, group in by_shape.items():
+        ms = np.array([x['ms'] for x in group])
+        phases = {}
+        for x in group:
+            for k, v in x['phases'].items():
+                phases[k] = phases.get(k, 0.0) + v
+        worst = max(phases, key=phases.get) if phases else None
+        summary.append({'shape': this_shape, 'count': len(group), 'total': float(ms.sum()),
+                        'p50': float(np.median(ms)), 'max': float(ms.max()),
+                        'rows': float(np.mean([x['rows'] for x in group])),
+                        'records': float(np.mean([x['records'] or 0 for x in group])),
+                        'worst_phase': worst,
+                        'worst_phase_ms': phases[worst] / len(group) if worst else 0.0})
+    return sorted(summary, key=lambda x: -x['total'])
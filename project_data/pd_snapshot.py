@@ -0,0 +1,87 @@
+"""
+On-disk snapshot (.npz) of the tables and columns read_data builds, so a fresh process can
+skip reading and parsing the database when it hasn't changed.
+
+The snapshot is keyed on the database file state (mtime, size, any -wal file, the schema)
+and SNAPSHOT_VERSION.  PRAGMA data_version only means something within one connection, so it
+can't key a file shared between processes;  Data.refresh uses it instead.
+
+The column arrays are stored as npz arrays;  the table values and categories (python str,
+None, lists...) are pickled into a single 'objects' array, so only load snapshots you wrote.
+"""
+import os
+import json
+import pickle
+import sqlite3
+import numpy as np
+
+SNAPSHOT_VERSION = 2
+tables = ['records', 'updated', 'types', 'trace']
+
+
+def snapshot_file(db_file):
+    return db_file + '.snapshot.npz'
+
+
+def file_key(db_file):
+    """Return the dict describing the state of db_file that a snapshot must match."""
+    key = {'version': SNAPSHOT_VERSION}
+    for sfx in ['', '-wal']:
+        try:
+            st = os.stat(db_file + sfx)
+        except FileNotFoundError:
+            continue
+        key['mtime' + sfx] = st.st_mtime_ns
+        key['size' + sfx] = st.st_size
+    conn = sqlite3.connect(db_file)
+    try:
+        key['schema'] = [list(x) for x in conn.execute(
+            "SELECT type, name, sql FROM sqlite_master ORDER BY type, name")]
+    finally:
+        conn.close()
+    return key
+
+
+def save(db_file, key, db, columns):
+    """
+    Write the snapshot of the db tables and columns for db_file (state key).
+    It is written to a temporary file and moved into place, so readers never see half of it.
+    """
+    arrays = {'key': np.array(json.dumps(key))}
+    objects = {'tables': {}, 'columns': {}}
+    for table in tables:
+        objects['tables'][table] = {col: getattr(getattr(db, table), col)
+                                    for col in db.tables[table].cols}
+    for name, arr in columns.to_arrays().items():
+        if isinstance(arr, np.ndarray):
+            arrays['columns:' + name] = arr
+        else:
+            objects['columns'][name] = arr
+    arrays['objects'] = np.frombuffer(pickle.dumps(objects, protocol=pickle.HIGHEST_PROTOCOL),
+                                      dtype=np.uint8)
+    tmpfile = snapshot_file(db_file) + '.tmp'
+    with open(tmpfile, 'wb') as fp:
+        np.savez(fp, **arrays)
+    os.replace(tmpfile, snapshot_file(db_file))
+
+
+def load(db_file, key):
+    """
+    Return (tables, column arrays) from the snapshot of db_file, where tables is a dict of
+    {table: {col: list}}, or (None, reason) if there is no usable snapshot for state key.
+    """
+    filename = snapshot_file(db_file)
+    if not os.path.exists(filename):
+        return None, 'no snapshot'
+    try:
+        with np.load(filename) as npz:
+            if json.loads(str(npz['key'])) != key:
+                return None, 'stale'
+            objects = pickle.loads(npz['objects'].tobytes())
+            arrays = objects['columns']
+            for name in npz.files:
+                if name.startswith('columns:'):
+                    arrays[name.split(':', 1)[1]] = npz[name]
+    except Exception as e:  # missing keys, truncated or corrupt file
+        return None, 'unreadable ({})'.format(e)
+    return objects['tables'], arrays
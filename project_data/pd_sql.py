@@ -0,0 +1,203 @@
+"""Compile Data.find calls into parameterized SQLite queries on the records table."""
+import sqlite3
+import datetime
+import numpy as np
+from project_data import pd_utils, pd_columns, filters
+
+SEP = '\x1f'  # joins a list filter into a single sql parameter
+
+
+def _iso(day):
+    if np.isnat(day):
+        return None
+    return str(day)
+
+
+def pd_date(value):
+    """First date of value as yyyy-mm-dd (sortable in sql), or NULL."""
+    return _iso(pd_columns.split_value(value)[0])
+
+
+def register_functions(conn, ganttable_status, now=None):
+    """
+    Register the functions compiled queries use, so that they keep the python semantics
+    of Filter and check_ganttable_status (listified comma fields, case, lateness).
+    """
+    if now is None:
+        now = datetime.datetime.now()
+    flt = filters.Filter()
+    today = np.datetime64(now)
+
+    def pd_filter(rec_val, finding):
+        return flt._filter_field(finding.split(SEP), flt._rec_val(rec_val))
+
+    def pd_status(status, value):
+        status_code = pd_columns.base_status(status, ganttable_status)
+        start = pd_columns.split_value(value)[0]
+        if status_code not in ('complete', 'removed') and start < today:
+            status_code = 'late'
+        return status_code
+
+    def pd_search(entry_val, value, match):
+        return pd_utils.searchfield(value, entry_val, match)
+
+    conn.create_function('pd_date', 1, pd_date, deterministic=True)
+    conn.create_function('pd_filter', 2, pd_filter, deterministic=True)
+    conn.create_function('pd_status', 2, pd_status)
+    conn.create_function('pd_search', 3, pd_search, deterministic=True)
+
+
+def connect(db_file, ganttable_status, now=None):
+    """Return a sqlite3 connection with the pd_ functions registered."""
+    conn = sqlite3.connect(db_file)
+    register_functions(conn, ganttable_status, now=now)
+    return conn
+
+
+def compile_find(value, value2=None, field='value', match='weak', ganttable=True,
+                 project_start='14/09/01', fields=None, order_by=None, **kwargs):
+    """
+    Turn a find call into (sql, params) selecting the matching rows of records.
+
+    Parameters
+    ----------
+    value, value2, field, match, kwargs
+        As for Data.find.  kwargs are the filters.find_allowed filters, which (as in find)
+        only apply to the date search of ganttable databases.
+    ganttable : bool
+        Whether the database is ganttable (value is a date)
+    project_start : str
+        Start date used if only one date is given
+    fields : list or None
+        Valid records columns, used to check field/order_by before putting them in the sql
+    order_by : list or None
+        Columns to sort on (id is always the final key)
+
+    Returns
+    -------
+    tuple
+        sql string and parameter list
+    """
+    for fld in [field] + (order_by or []):
+        if fields is not None and fld not in fields:
+            raise ValueError("{} is not a records field.".format(fld))
+    where = []
+    params = []
+    if value == 'since':
+        raise ValueError("'since' needs the updated table loaded:  use read_data/find.")
+    if ganttable and field.lower() == 'value':
+        if 'upda' in match.lower() or 'init' in match.lower():
+            raise ValueError("{} not supported in queries.".format(match))
+        if value2 is None:
+            value2 = value
+            value = project_start
+        value1time = pd_utils.get_time(value)
+        value2time = pd_utils.get_time(value2)
+        if value1time is None or value2time is None:
+            raise ValueError("Invalid dates {} - {}".format(value, value2))
+        where.append('pd_date(value) BETWEEN ? AND ?')
+        params += [value1time.strftime('%Y-%m-%d'), value2time.strftime('%Y-%m-%d')]
+        flt = filters.Filter()
+        for allowed in flt.find_allowed:
+            finding = kwargs.get(allowed)
+            if finding is None:
+                continue
+            finding = [str(x) for x in pd_utils.listify(finding)]
+            if any(str(x).strip().lower() in flt.pass_thru for x in finding):
+                continue  # pass-through, no clause needed
+            if allowed == 'status':
+                where.append('pd_filter(pd_status(status, value), ?)')
+            else:
+                where.append('pd_filter({}, ?)'.format(allowed))
+            params.append(SEP.join(finding))
+    else:
+        where.append('pd_search({}, ?, ?)'.format(field))
+        params += [value, match]
+    sql = 'SELECT * FROM records'
+    if len(where):
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY ' + ', '.join((order_by or []) + ['id'])
+    return sql, params
+
+
+# Optional FTS5 (trigram) shadow index over the free-text records fields
+text_index_fields = ['description', 'notes', 'commentary']
+
+
+def has_text_index(conn):
+    """True if the records_fts shadow index exists in the database."""
+    return conn.execute("SELECT count(*) FROM sqlite_master WHERE name='records_fts'"
+                        ).fetchone()[0] > 0
+
+
+def create_text_index(conn):
+    """
+    Create (or rebuild) the records_fts shadow index and the triggers that keep it in sync
+    with records.  Returns False if this sqlite has no FTS5 trigram tokenizer.
+
+    The index is keyed on the records rowid, so rerun this after a VACUUM.
+
+    The triggers live in the database, so once it is built every sqlite that writes to
+    records (other tools and machines too, e.g. pd_setupdb.py) needs FTS5 with the trigram
+    tokenizer (sqlite >= 3.34), or its writes fail with "no such module: fts5".  Use
+    drop_text_index to go back to a plain database.
+    """
+    flds = ', '.join(text_index_fields)
+    new = ', '.join(['new.{}'.format(x) for x in text_index_fields])
+    old = ', '.join(['old.{}'.format(x) for x in text_index_fields])
+    delete = ("INSERT INTO records_fts(records_fts, rowid, {}) VALUES('delete', old.rowid, {});"
+              .format(flds, old))
+    insert = "INSERT INTO records_fts(rowid, {}) VALUES(new.rowid, {});".format(flds, new)
+    try:
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS records_fts")
+            conn.execute("CREATE VIRTUAL TABLE records_fts USING fts5({}, content='records', "
+                         "tokenize='trigram')".format(flds))
+    except sqlite3.OperationalError as e:
+        print("Text index not available:  {}".format(e))
+        return False
+    with conn:
+        conn.execute("CREATE TRIGGER IF NOT EXISTS records_fts_ai AFTER INSERT ON records "
+                     "BEGIN {} END".format(insert))
+        conn.execute("CREATE TRIGGER IF NOT EXISTS records_fts_ad AFTER DELETE ON records "
+                     "BEGIN {} END".format(delete))
+        conn.execute("CREATE TRIGGER IF NOT EXISTS records_fts_au AFTER UPDATE OF {} ON records "
+                     "BEGIN {} {} END".format(flds, delete, insert))
+        conn.execute("INSERT INTO records_fts(records_fts) VALUES('rebuild')")
+    return True
+
+
+def drop_text_index(conn):
+    """
+    Remove the records_fts index and its triggers, so sqlite builds without FTS5 can write
+    to records again.  The triggers are dropped first:  that works without FTS5, whereas
+    dropping the virtual table itself needs it.  Returns False if the table couldn't go.
+    """
+    with conn:
+        for trigger in ['records_fts_ai', 'records_fts_ad', 'records_fts_au']:
+            conn.execute("DROP TRIGGER IF EXISTS {}".format(trigger))
+    try:
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS records_fts")
+    except sqlite3.OperationalError as e:
+        print("Text index triggers dropped, but not the table:  {}".format(e))
+        return False
+    return True
+
+
+def text_candidates(conn, field, value):
+    """
+    Return the refnames whose field may contain value (case-insensitive), or None if the
+    index can't answer (field not indexed or value shorter than a trigram).
+    """
+    value = value.strip()
+    if field not in text_index_fields or len(value) < 3:
+        return None
+    phrase = '{} : "{}"'.format(field, value.replace('"', '""'))
+    try:
+        cursor = conn.execute("SELECT records.refname FROM records_fts JOIN records "
+                              "ON records.rowid = records_fts.rowid WHERE records_fts MATCH ?",
+                              (phrase,))
+        return [x[0] for x in cursor]
+    except sqlite3.OperationalError:
+        return None
@@ -0,0 +1,142 @@
+"""
+Synthetic milestone databases (same schema as milestones.db) for benchmarking.
+
+The distributions follow milestones.db:  about 60% of past milestones complete with a lag,
+a few moved/removed, a couple of updates per record and a fraction tracing to other records.
+"""
+import os
+import math
+import random
+import sqlite3
+import datetime
+
+schema = {
+    'records': 'CREATE TABLE "records" (`refname` TEXT, `value` TEXT, `description` TEXT, '
+               '`dtype` TEXT, `status` TEXT, `owner` TEXT, `other` TEXT, `notes` TEXT, '
+               '`id` INTEGER, `commentary` TEXT, PRIMARY KEY(refname))',
+    'types': 'CREATE TABLE "types" (`name` TEXT, `description` TEXT, `start` TEXT, '
+             '`duration_months` INTEGER, PRIMARY KEY(`name`))',
+    'trace': 'CREATE TABLE "trace" ("refname" TEXT, "tracename" TEXT, "tracetype" TEXT, '
+             '"comment" TEXT, PRIMARY KEY("refname","tracename"))',
+    'updated': 'CREATE TABLE "updated" ("refname" TEXT, "updated" TEXT, "by" TEXT, "note" TEXT, '
+               '"previous" TEXT, FOREIGN KEY("refname") REFERENCES "records"("refname"), '
+               'PRIMARY KEY("refname","updated","note","previous"))'
+}
+types = [('nsfA', 'nsf milestone for msip 2014', '14/09/01', None),
+         ('nsfB', 'nsf milestone for msip 2016', '16/09/01', 48),
+         ('nsfC', 'MSIP-2018', '18/10/01', 60),
+         ('gbmf', 'Gordon and Betty Moore Foundation', '18/02/01', 60),
+         ('internal', 'project internal', None, None),
+         ('planning', 'planning purposes', None, None)]
+dtype_weights = [10, 40, 30, 5, 10, 5]
+owners = ['analysis', 'arc', 'asp', 'comm', 'dsp', 'epo', 'host', 'img', 'lib', 'mc', 'node',
+          'opm', 'ops', 'pem', 'pm', 'proc', 'psp', 'qa', 'rtp', 'sims', 'site', 'srdr', 'stats',
+          'sys', 'val']
+updaters = ['ddeboer', 'jhewitt', 'zabdurashidova', 'mdexter']
+words = ['antenna', 'feed', 'node', 'correlator', 'pipeline', 'release', 'review', 'install',
+         'deploy', 'test', 'calibration', 'imaging', 'power', 'spectrum', 'site', 'survey',
+         'poles', 'cable', 'receiver', 'firmware', 'software', 'report', 'paper', 'workshop',
+         'commissioning', 'validation', 'simulation', 'archive', 'monitor', 'control']
+trace_types = [('milestone', 3), ('component', 8), ('reqspec', 4), ('system', 1), ('task', 1)]
+
+
+def _yymmdd(day):
+    return "{:02d}/{:02d}/{:02d}".format(day.year - 2000, day.month, day.day)
+
+
+def _poisson(rng, lam):
+    """Poisson-distributed count with mean lam (Knuth's method, fine for small lam)."""
+    limit, k, p = math.exp(-lam), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+def _status(rng, day, now):
+    """A status string like those in milestones.db for a milestone on day."""
+    if day > now:
+        return rng.choice([None] * 8 + ['Moved from {}'.format(_yymmdd(day - datetime.timedelta(
+            rng.randint(30, 180)))), 'Moved {}'.format(rng.randint(10, 120))])
+    x = rng.random()
+    if x < 0.65:
+        return 'Complete {}'.format(int(rng.gauss(0, 45)))
+    if x < 0.70:
+        return 'Removed'
+    if x < 0.78:
+        return 'Moved {}'.format(rng.randint(10, 120))
+    return None
+
+
+def make_db(db_file, n_records, seed=1, start='14/09/01', years=10, range_fraction=0.05,
+            mean_updates=2.0, mean_trace=0.5, now=None, chunk=50000):
+    """
+    Write a synthetic milestone database of n_records to db_file (replacing it).
+
+    Parameters
+    ----------
+    db_file : str
+        Database file to write
+    n_records : int
+        Number of records
+    seed : int
+        Random seed (the same arguments give the same database)
+    start : str
+        First date (yy/mm/dd);  values are spread over the following years
+    range_fraction : float
+        Fraction of values that are 'start - end' ranges
+    mean_updates : float
+        Mean number of updated rows per record (at least the initial one)
+    mean_trace : float
+        Mean number of trace rows per record
+    now : datetime or None
+        Time before which milestones get completed/late statuses (default the real now)
+    chunk : int
+        Records generated and inserted per transaction
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.now() if now is None else now
+    t0 = datetime.datetime.strptime(start, '%y/%m/%d')
+    span = int(years * 365.25)
+    if os.path.exists(db_file):
+        os.remove(db_file)
+    conn = sqlite3.connect(db_file)
+    with conn:
+        for xcmd in schema.values():
+            conn.execute(xcmd)
+        conn.executemany('INSERT INTO types VALUES (?, ?, ?, ?)', types)
+    dtypes = [x[0] for x in types]
+    ttypes = [x[0] for x in trace_types]
+    tweights = [x[1] for x in trace_types]
+    for c0 in range(0, n_records, chunk):
+        records, updated, trace = [], [], []
+        for i in range(c0, min(c0 + chunk, n_records)):
+            refname = 'ms{:07d}'.format(i)
+            day = t0 + datetime.timedelta(rng.randrange(span))
+            value = _yymmdd(day)
+            if rng.random() < range_fraction:
+                value += ' - ' + _yymmdd(day + datetime.timedelta(rng.randint(30, 365)))
+            description = '{} {} {} ({})'.format(*rng.sample(words, 3), i)
+            records.append((refname, value, description.capitalize(),
+                            rng.choices(dtypes, dtype_weights)[0], _status(rng, day, now),
+                            rng.choice(owners), rng.choice([None] * 9 + ['JH', 'ZA']), '',
+                            i, None))
+            up_day = day - datetime.timedelta(rng.randint(60, 720))
+            for k in range(1 + _poisson(rng, max(mean_updates - 1.0, 0.0))):
+                note = 'Initial' if k == 0 else rng.choice(['status', 'moved', 'updated dates'])
+                previous = '' if k == 0 else '[status: {}]'.format(_status(rng, day, now))
+                updated.append((refname, _yymmdd(up_day), rng.choice(updaters), note, previous))
+                up_day += datetime.timedelta(rng.randint(1, 120))
+            for k in range(_poisson(rng, mean_trace)):
+                ttype = rng.choices(ttypes, tweights)[0]
+                if ttype == 'milestone' and i:
+                    tracename = 'ms{:07d}'.format(rng.randrange(max(0, i - 200), i))
+                else:
+                    tracename = '{}{}'.format(ttype, rng.randrange(50))
+                trace.append((refname, tracename, ttype, None))
+        with conn:
+            conn.executemany('INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             records)
+            conn.executemany('INSERT OR IGNORE INTO updated VALUES (?, ?, ?, ?, ?)', updated)
+            conn.executemany('INSERT OR IGNORE INTO trace VALUES (?, ?, ?, ?)', trace)
+    conn.close()
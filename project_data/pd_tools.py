@@ -1,6 +1,7 @@
 #! /usr/bin/env python
 from datetime import datetime as dt
 from dateutil import relativedelta
+from project_data import pd_dates
 
 
 def recurring_monthly(start_date, stop_date, base_string, tstr=None):
@@ -21,13 +22,10 @@ def _a_time_conversion(this_date, tstr_list_to_try=None):
     elif isinstance(tstr_list_to_try, str):
         tstr_list_to_try = [tstr_list_to_try]
     for this_tstr in tstr_list_to_try:
-        this_tstr = this_tstr.replace('-', '/')
-        try:
-            return dt.strptime(this_date, this_tstr)
-        except ValueError:
-            continue
-    else:
-        raise ValueError('No valid conversion string.')
+        this_time = pd_dates.parse(this_date, this_tstr.replace('-', '/'))
+        if this_time is not None:
+            return this_time
+    raise ValueError('No valid conversion string.')
 
 
 def generate_recurring(start_date, stop_date, show_print=True,
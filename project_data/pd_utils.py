@@ -1,20 +1,15 @@
 import datetime
+from project_data import pd_dates
 
 
-def get_time(timestr):
+def get_time(timestr, verbose=True):
     if timestr is None:
         return None
     if isinstance(timestr, datetime.datetime):
         return timestr
-    timestr = timestr.strip()
-    try:
-        timeval = datetime.datetime.strptime(timestr, '%y/%m/%d')
-    except ValueError:
-        try:
-            timeval = datetime.datetime.strptime(timestr, '%Y/%m/%d')
-        except ValueError:
-            print('Incorrect time:  ', timestr)
-            timeval = None
+    timeval = pd_dates.parse_ymd(timestr)
+    if timeval is None and verbose:
+        print('Incorrect time:  ', timestr.strip())
     return timeval
 
 
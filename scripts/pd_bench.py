@@ -0,0 +1,147 @@
+#! /usr/bin/env python
+"""
+Benchmark the Data pipeline on synthetic milestone databases (see pd_synth).
+
+Each result is appended as a json line (with the git commit) to the results file, and
+compared with the last result for the same size from another commit.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import time
+from project_data import Data_class, pd_synth, pd_gantt
+
+o = argparse.ArgumentParser()
+o.add_argument('-n', '--sizes', help='comma-separated numbers of records', default='1000,10000')
+o.add_argument('-r', '--repeat', help='runs of each benchmark (best is kept)', type=int, default=3)
+o.add_argument('-w', '--workdir', help='directory for the generated databases',
+               default='bench_dbs')
+o.add_argument('--results', help='json-lines file to append results to',
+               default='bench_results.jsonl')
+o.add_argument('--seed', help='random seed for the databases', type=int, default=1)
+args = o.parse_args()
+
+NOW = datetime.datetime(2021, 6, 1)  # fixed, so the statuses don't drift between runs
+
+
+def git_commit():
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True, cwd=here).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+@contextlib.contextmanager
+def quiet():
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def best_of(func, setup=None):
+    """Best time of args.repeat runs of func (setup runs untimed before each)."""
+    times = []
+    for _ in range(args.repeat):
+        with quiet():
+            if setup is not None:
+                setup()
+            t0 = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def make_json(dbfile, base_json):
+    """Write a databases json (from base_json) using dbfile, and return its name."""
+    with open(base_json) as fp:
+        dbjson = json.load(fp)
+    dbjson['databases']['milestone']['dbfilename'] = dbfile
+    dbjson['state_variables'].update(as_of=NOW.strftime('%y/%m/%d'), snapshot_cache=False,
+                                     slow_query_ms=None)
+    json_file = os.path.splitext(dbfile)[0] + '.json'
+    with open(json_file, 'w') as fp:
+        json.dump(dbjson, fp, indent=2)
+    return json_file
+
+
+def bench(n, base_json):
+    dbfile = 'milestones_{}.db'.format(n)
+    if not os.path.exists(dbfile):
+        print('Generating {} records'.format(n))
+        pd_synth.make_db(dbfile, n, seed=args.seed, now=NOW)
+
+    res = {}
+    d = Data_class.Data('milestone', db_file=make_json(dbfile, base_json))
+    res['read_data'] = best_of(d.read_data)
+    d.snapshot_cache = True
+    with quiet():
+        d.read_data()  # write the snapshot
+    res['read_data (snapshot)'] = best_of(d.read_data)
+    res['find date'] = best_of(lambda: d.find('18/01/01', '19/01/01', display='noshow'))
+    res['find date+filters'] = best_of(lambda: d.find('18/01/01', '21/01/01', dtype='nsfC',
+                                                      owner='mc,dsp', status='late',
+                                                      display='noshow'))
+    res['find text'] = best_of(lambda: d.find('feed', field='description', display='noshow'))
+    res['getview'] = best_of(lambda: d.getview('all', ['value', 'owner']), d._data_changed)
+    with quiet():
+        found = d.find('14/09/01', '24/09/01', display='noshow')
+    res['make_find_stats'] = best_of(lambda: d.make_find_stats(found))
+    with quiet():
+        d.find('14/09/01', '24/09/01', dtype='nsfC', display='noshow')
+    res['dtype_info'] = best_of(lambda: d.dtype_info('nsfC', plot_stats=''))
+    fig = pd_gantt.new_figure()
+    view = found[:500]
+    res['gantt (500 rows)'] = best_of(lambda: d.gantt(view, fig=fig, cdf_fig=fig))
+
+    updfile = 'upd_{}.db'.format(n)
+    shutil.copy(dbfile, updfile)
+    u = Data_class.Data('milestone', db_file=make_json(updfile, base_json))
+    changes = [{'refname': 'ms{:07d}'.format(i), 'status': 'Complete 3'}
+               for i in range(0, n, max(1, n // 100))]
+
+    def fresh_copy():
+        shutil.copy(dbfile, updfile)
+        u.read_data()
+    res['update_many (100)'] = best_of(lambda: u.update_many(changes, updater='bench',
+                                                             upnote='bench'), fresh_copy)
+    u._conn.close()
+    for fn in [updfile, os.path.splitext(updfile)[0] + '.json']:
+        os.remove(fn)
+    return res
+
+
+os.makedirs(args.workdir, exist_ok=True)
+results_file = os.path.abspath(args.results)
+base_json = os.path.abspath('databases.json')
+commit = git_commit()
+previous = {}  # last result for each size from another commit
+if os.path.exists(results_file):
+    with open(results_file) as fp:
+        for line in fp:
+            entry = json.loads(line)
+            if entry['commit'] != commit:
+                previous[entry['size']] = entry
+cwd = os.getcwd()
+os.chdir(args.workdir)
+try:
+    for n in [int(x) for x in args.sizes.split(',')]:
+        res = bench(n, base_json)
+        entry = {'commit': commit, 'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                 'size': n, 'repeat': args.repeat, 'results': res}
+        with open(results_file, 'a') as fp:
+            fp.write(json.dumps(entry) + '\n')
+        last = previous.get(n)
+        vs = '' if last is None else ', vs {}'.format(last['commit'])
+        print('\n{} records (commit {}{})'.format(n, commit, vs))
+        for name, t in res.items():
+            cmp = ''
+            if last is not None and last['results'].get(name):
+                cmp = '  x{:.2f}'.format(t / last['results'][name])
+            print('  {:30s} {:10.4f} s{}'.format(name, t, cmp))
+finally:
+    os.chdir(cwd)
@@ -0,0 +1,53 @@
+#! /usr/bin/env python
+import argparse
+import json
+from project_data import Data_class, pd_profile
+
+o = argparse.ArgumentParser(description='Write gantt charts to files (no display needed).')
+o.add_argument('dbtype', help='allowed data types are milestone, task, wbs (need only first two '
+               'letters)')
+o.add_argument('-w', '--window', help='date window, e.g. 19/01/01,20/06/01 (one date is from '
+               'the project start)', default=None)
+o.add_argument('--views', help='json file with a list of views (find arguments, e.g. '
+               '{"name": "hw", "value": "19/01/01", "value2": "20/06/01", "owner": "hw"})',
+               default=None)
+o.add_argument('--dtype', help='dtype(s) to filter on', default='all')
+o.add_argument('--owner', help='owner(s) to filter on', default=None)
+o.add_argument('--status', help='status(es) to filter on', default=None)
+o.add_argument('--per', help='make a view per unique value of this field (e.g. dtype, owner)',
+               default=None)
+o.add_argument('-o', '--outdir', help='directory for the files', default='.')
+o.add_argument('-f', '--format', help='file format (png, svg, pdf)', default='png')
+o.add_argument('--dpi', help='resolution of png files', type=int, default=100)
+o.add_argument('--colorbar', help='also write the color bar', action='store_true')
+pd_profile.add_argument(o)
+args = o.parse_args()
+
+dbtype = args.dbtype[0:2].lower()
+dtypeDict = {'mi': 'milestone', 'ta': 'task', 'wb': 'wbs'}
+
+with pd_profile.from_args(args):
+    d = Data_class.Data(dtypeDict[dbtype])
+    d.read_data()
+    if args.views is not None:
+        with open(args.views, 'r') as fp:
+            views = json.load(fp)
+    else:
+        if args.window is None:
+            o.error('need a --window or --views')
+        base = {'value': args.window.split(',')[0]}
+        if ',' in args.window:
+            base['value2'] = args.window.split(',')[1]
+        for fo in ['dtype', 'owner', 'status']:
+            if getattr(args, fo) is not None:
+                base[fo] = getattr(args, fo)
+        if args.per is None:
+            views = [dict(base, name='gantt')]
+        else:
+            views = []
+            for val in d.unique(args.per, returnList=True):
+                views.append(dict(base, name='gantt_{}'.format(val).replace('/', '_'),
+                                  **{args.per: val}))
+    for filename in d.export_gantt(views, outdir=args.outdir, fmt=args.format, dpi=args.dpi,
+                                   colorbar=args.colorbar):
+        print('Wrote {}'.format(filename))
@@ -1,6 +1,6 @@
 #! /usr/bin/env python
 
-from project_data import Data_class, Arch_class
+from project_data import Data_class, pd_profile
 import argparse
 
 
@@ -9,6 +9,16 @@ o.add_argument('dbtype', help='allowed data types are milestone, reqspec, interf
                'risk, architecture (need only first two letters)')
 o.add_argument('-v', '--view', help='what record types to see in listing', default='all')
 o.add_argument('-s', '--howsort', help='what entryMap field to use to sort', default='value')
+o.add_argument('-f', '--find', help='value(s) to find, e.g. 20/06/01 or 19/01/01,20/06/01.  '
+               'Only the matching records are read from the database.', default=None)
+o.add_argument('--field', help='field in which to find', default='value')
+o.add_argument('--match', help='strength of match (weak, moderate, strong, verystrong)',
+               default='weak')
+o.add_argument('--dtype', help='dtype(s) to filter find on', default=None)
+o.add_argument('--status', help='status(es) to filter find on', default=None)
+o.add_argument('--owner', help='owner(s) to filter find on', default=None)
+o.add_argument('--other', help='other(s) to filter find on', default=None)
+pd_profile.add_argument(o)
 args = o.parse_args()
 
 
@@ -16,12 +26,31 @@ dbtype = args.dbtype[0:2].lower()
 dtypeDict = {'mi': 'milestone', 're': 'reqspec', 'in': 'interface', 'ri': 'risk',
              'ar': 'architecture'}
 
-if dbtype == 'ar':
-    print('Architecture')
-    d = Arch_class.Data()
-else:
-    d = Data_class.Data(dtypeDict[dbtype])
-print('----------------Reading in--------------------')
-d.readData()
-print('\n----------------Listing-----------------------\n')
-d.show(howsort=args.howsort, requested_dtype=args.view)
+with pd_profile.from_args(args):
+    if dbtype == 'ar':
+        from project_data import Arch_class
+        print('Architecture')
+        d = Arch_class.Data()
+        print('----------------Reading in--------------------')
+        d.readData()
+        print('\n----------------Listing-----------------------\n')
+        d.show(howsort=args.howsort, requested_dtype=args.view)
+    elif args.find is not None:
+        d = Data_class.Data(dtypeDict[dbtype])
+        filter_on = {}
+        for fo in ['dtype', 'status', 'owner', 'other']:
+            if getattr(args, fo) is not None:
+                filter_on[fo] = getattr(args, fo)
+        values = args.find.split(',')
+        for rec in d.query(*values, field=args.field, match=args.match, howsort=args.howsort,
+                           **filter_on):
+            print('{:10.10} {} ({})'.format(str(rec.value), rec.description, rec.status))
+    else:
+        d = Data_class.Data(dtypeDict[dbtype])
+        print('----------------Reading in--------------------')
+        d.read_data()
+        print('\n----------------Listing-----------------------\n')
+        view = 'all'
+        if args.view != 'all':
+            view = [i for i, x in enumerate(d.db.records.dtype) if x == args.view]
+        d.show(d.getview(view, args.howsort))
@@ -0,0 +1,48 @@
+#! /usr/bin/env python
+import argparse
+import os
+from project_data import pd_utils, pd_slowlog
+
+o = argparse.ArgumentParser(description='Summarize the slow-query log of a database (the calls '
+                            'slower than the slow_query_ms state variable).')
+o.add_argument('dbtype', nargs='?', help='database (as in databases.json)', default='milestone')
+o.add_argument('-l', '--log', help='log file to read instead of the one next to the database',
+               default=None)
+o.add_argument('--op', help='only this operation (find, getref, update, update_many, gantt)',
+               default=None)
+o.add_argument('--since', help='only entries from this date (yyyy-mm-dd) on', default=None)
+o.add_argument('-n', '--top', help='number of shapes and of slowest calls to show', type=int,
+               default=10)
+args = o.parse_args()
+
+if args.log is None:
+    db_list, _ = pd_utils.get_db_json('databases.json')
+    args.log = pd_slowlog.log_file(os.path.join(db_list[args.dbtype]['subdirectory'],
+                                                db_list[args.dbtype]['dbfilename']))
+if not os.path.exists(args.log):
+    print('No slow-query log {}'.format(args.log))
+    raise SystemExit
+entries = pd_slowlog.read(args.log)
+if args.op is not None:
+    entries = [x for x in entries if x['op'] == args.op]
+if args.since is not None:
+    entries = [x for x in entries if x['time'] >= args.since]
+print('{} slow calls in {}\n'.format(len(entries), args.log))
+if not len(entries):
+    raise SystemExit
+
+print('{:>6s} {:>10s} {:>8s} {:>8s} {:>7s} {:>8s}  {}'
+      .format('count', 'total ms', 'p50', 'max', 'rows', 'records',
+              'shape  [worst phase, ms/call]'))
+for this in pd_slowlog.report(entries)[:args.top]:
+    print('{:6d} {:10.0f} {:8.0f} {:8.0f} {:7.0f} {:8.0f}  {}  [{}, {:.0f}]'
+          .format(this['count'], this['total'], this['p50'], this['max'], this['rows'],
+                  this['records'], this['shape'], this['worst_phase'], this['worst_phase_ms']))
+
+print('\nSlowest calls:')
+for entry in sorted(entries, key=lambda x: -x['ms'])[:args.top]:
+    phases = ', '.join(['{} {:.0f}'.format(k, v) for k, v in
+                        sorted(entry['phases'].items(), key=lambda x: -x[1])[:3]])
+    print('{:8.0f} ms  {}  {}  args={} kwargs={} rows={}  ({})'
+          .format(entry['ms'], entry['time'], entry['op'], entry['args'], entry['kwargs'],
+                  entry['rows'], phases))
@@ -0,0 +1,21 @@
+#! /usr/bin/env python
+"""Write a synthetic milestone database (for benchmarking, see pd_bench.py)."""
+import argparse
+from project_data import pd_synth
+
+o = argparse.ArgumentParser()
+o.add_argument('n_records', help='number of records, e.g. 1000, 1000000', type=int)
+o.add_argument('-o', '--output', help='database file to write', default=None)
+o.add_argument('--seed', help='random seed', type=int, default=1)
+o.add_argument('--updates', help='mean updated rows per record', type=float, default=2.0)
+o.add_argument('--trace', help='mean trace rows per record', type=float, default=0.5)
+o.add_argument('--ranges', help='fraction of values that are date ranges', type=float,
+               default=0.05)
+args = o.parse_args()
+
+output = args.output
+if output is None:
+    output = 'milestones_{}.db'.format(args.n_records)
+pd_synth.make_db(output, args.n_records, seed=args.seed, mean_updates=args.updates,
+                 mean_trace=args.trace, range_fraction=args.ranges)
+print('Wrote {} records to {}'.format(args.n_records, output))
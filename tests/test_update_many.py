@@ -0,0 +1,50 @@
+import json
+import os
+import sqlite3
+import pytest
+from project_data import Data_class, pd_synth
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def data(tmp_path):
+    dbfile = str(tmp_path / 'milestones.db')
+    pd_synth.make_db(dbfile, 50)
+    with open(os.path.join(here, '..', 'databases.json')) as fp:
+        dbjson = json.load(fp)
+    dbjson['databases']['milestone']['dbfilename'] = dbfile
+    dbjson['state_variables'].update(snapshot_cache=False, slow_query_ms=None)
+    json_file = str(tmp_path / 'databases.json')
+    with open(json_file, 'w') as fp:
+        json.dump(dbjson, fp)
+    d = Data_class.Data('milestone', db_file=json_file)
+    d.read_data()
+    return d
+
+
+def test_repeated_refname_previous(data):
+    refname = data.db.records.refname[0]
+    data.update(refname, updater='test', upnote='setup', status='Complete 1')
+    data.update_many([{'refname': refname, 'status': 'Moved 10'},
+                      {'refname': refname, 'status': 'Moved 20'}], updater='test', upnote='batch')
+    conn = sqlite3.connect(data.inFile)
+    previous = [x[0] for x in conn.execute(
+        "SELECT previous FROM updated WHERE refname=? AND note='batch' ORDER BY rowid", (refname,))]
+    status = conn.execute("SELECT status FROM records WHERE refname=?", (refname,)).fetchone()[0]
+    conn.close()
+    assert previous == ['[status: Complete 1]', '[status: Moved 10]']
+    assert status == 'Moved 20'
+    assert data.db.records.status[0] == 'Moved 20'
+
+
+def test_new_records_note_initial(data):
+    data.session_upnote = 'session note'
+    data.add(description='Added singly', value='21/01/01', updater='test')
+    data.add_many([{'description': 'Added in a batch', 'value': '21/01/02'}], updater='test')
+    conn = sqlite3.connect(data.inFile)
+    notes = [x[0] for x in conn.execute(
+        "SELECT note FROM updated WHERE refname IN (SELECT refname FROM records "
+        "WHERE description LIKE 'Added %') ORDER BY rowid")]
+    conn.close()
+    assert notes == ['Initial', 'Initial']